@@ -2,6 +2,7 @@
 Flow Diagram Animation Assistant - Main Streamlit Application
 """
 import os
+from collections import deque
 import streamlit as st
 from dotenv import load_dotenv
 from src.mermaid_generator import display_mermaid, export_mermaid
@@ -12,7 +13,7 @@ from src.ollama_client import OllamaClient
 from src.diagram_generator import DiagramGenerator
 from src.animation import animate_diagram
 from src.utils.logger import setup_logger
-from src.system_templates import display_system_design_template, get_system_design_template
+from src.system_templates import display_system_design_template, SYSTEM_DESIGN_TEMPLATE_BYTES
 
 # Load environment variables
 load_dotenv()
@@ -28,10 +29,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better UI
-def load_css():
-    """Load custom CSS"""
-    st.markdown("""
+# Custom CSS for better UI, built once per process
+CUSTOM_CSS = """
     <style>
     .main-header {
         font-size: 2.5rem;
@@ -69,13 +68,25 @@ def load_css():
         background-color: #F1F1F1;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def load_css():
+    """
+    Load custom CSS
+    
+    Streamlit clears elements that are not re-emitted, so the stylesheet
+    is sent on every full rerun; fragment reruns skip it entirely.
+    """
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Number of chat messages kept in the session and replayed on rerun
+MAX_CHAT_MESSAGES = 100
 
 # Session state initialization
 def init_session_state():
     """Initialize session state variables"""
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
     if "current_diagram" not in st.session_state:
         st.session_state.current_diagram = None
     if "animation_speed" not in st.session_state:
@@ -85,13 +96,15 @@ def init_session_state():
     if "animation_enabled" not in st.session_state:
         st.session_state.animation_enabled = True
 
-# Initialize Ollama client
+# Initialize Ollama client; the model is passed per call and never stored
+# on the client, so one client (and its HTTP session) is safely shared by
+# every session, whichever model each one selects
 @st.cache_resource
 def get_ollama_client():
     """Get or create Ollama client"""
     return OllamaClient(
         base_url=os.getenv("OLLAMA_API_BASE_URL", "http://localhost:11434"),
-        model_name=st.session_state.ollama_model
+        model_name=os.getenv("OLLAMA_MODEL_NAME", "llama2")
     )
 
 # Initialize diagram generator
@@ -100,6 +113,159 @@ def get_diagram_generator():
     """Get or create diagram generator"""
     return DiagramGenerator()
 
+class _FallbackSpec(Exception):
+    """Carries a fallback diagram out of the cached call, so it isn't cached"""
+
+# Diagram specs are cached per prompt and model, so repeating a prompt skips
+# the Ollama round-trip; the graph itself is rebuilt from the spec
+@st.cache_data(show_spinner=False, ttl=3600)
+def _cached_diagram_spec(prompt, model):
+    """Get a parsed diagram spec from Ollama, cached per prompt and model"""
+    spec = get_ollama_client().generate_flow_description(prompt, model=model)
+    if spec.get("_fallback"):
+        # Raising skips the cache, so a retry asks the model again
+        raise _FallbackSpec(spec)
+    return spec
+
+def generate_diagram_spec(prompt, model):
+    """Get the structured diagram spec for a prompt from Ollama"""
+    try:
+        return _cached_diagram_spec(prompt, model)
+    except _FallbackSpec as fallback:
+        return fallback.args[0]
+
+# Export payloads are cached on the diagram's content hash, so reruns don't
+# re-render (or, for GIFs, re-animate) an unchanged diagram
+EXPORT_CACHE_OPTIONS = dict(
+    show_spinner=False,
+    ttl=24 * 3600,
+    hash_funcs={dict: lambda d: d.get("_hash")}
+)
+
+@st.cache_data(**EXPORT_CACHE_OPTIONS)
+def cached_png(diagram):
+    """Export diagram as PNG, cached per diagram"""
+    return get_diagram_generator().export_as_png(diagram)
+
+@st.cache_data(**EXPORT_CACHE_OPTIONS)
+def cached_svg(diagram):
+    """Export diagram as SVG, cached per diagram"""
+    return get_diagram_generator().export_as_svg(diagram)
+
+@st.cache_data(**EXPORT_CACHE_OPTIONS)
+def cached_gif(diagram, duration, fps):
+    """Export diagram animation as GIF, cached per diagram and settings"""
+    from src.gif_export import export_as_gif
+    return export_as_gif(diagram, duration=duration, fps=fps)
+
+@st.cache_data(**EXPORT_CACHE_OPTIONS)
+def cached_mmd(diagram):
+    """Export diagram as Mermaid code, cached per diagram"""
+    return export_mermaid(diagram)
+
+# Diagram display and export run as a fragment, so the diagram and
+# the export widgets rerun on their own instead of rerunning the whole script
+@st.fragment
+def render_diagram_fragment(diagram, animation_enabled, speed, diagram_type):
+    """
+    Render the current diagram and its export options
+    
+    Args:
+        diagram: Enriched diagram data
+        animation_enabled: Whether to animate the interactive diagram
+        speed: Animation speed multiplier
+        diagram_type: Selected diagram type
+    """
+    diagram_generator = get_diagram_generator()
+    
+    st.markdown("<div class='sub-header'>Flow Diagram</div>", unsafe_allow_html=True)
+    
+    diagram_container = st.container()
+    with diagram_container:
+        st.markdown("<div class='diagram-container'>", unsafe_allow_html=True)
+        
+        if diagram_type == "Interactive":
+            # Show with or without animation based on settings
+            if animation_enabled:
+                animate_diagram(
+                    diagram, 
+                    speed=speed,
+                    container=diagram_container
+                )
+            else:
+                diagram_generator.display(diagram)
+        elif diagram_type == "Mermaid":
+            display_mermaid(diagram)
+        else:  # System Design Template
+            display_system_design_template(container=diagram_container)
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Export options
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        try:
+            png_data = cached_png(diagram)
+            st.download_button(
+                "Download as PNG",
+                data=png_data,
+                file_name="flow_diagram.png",
+                mime="image/png"
+            )
+        except Exception as e:
+            st.error(f"PNG export error: {str(e)}")
+            
+    with col2:
+        try:
+            svg_data = cached_svg(diagram)
+            st.download_button(
+                "Download as SVG",
+                data=svg_data,
+                file_name="flow_diagram.svg",
+                mime="image/svg+xml"
+            )
+        except Exception as e:
+            st.error(f"SVG export error: {str(e)}")
+            
+    with col3:
+        try:
+            animation_duration = st.session_state.get("animation_duration", 5.0)
+            
+            gif_data = cached_gif(
+                diagram,
+                duration=animation_duration,
+                fps=10
+            )
+            
+            st.download_button(
+                "Download as GIF",
+                data=gif_data,
+                file_name="flow_diagram.gif",
+                mime="image/gif"
+            )
+        except Exception as e:
+            st.error(f"GIF export error: {str(e)}")
+            
+    with col4:
+        if diagram_type == "System Design Template":
+            st.download_button(
+                "Download Template",
+                data=SYSTEM_DESIGN_TEMPLATE_BYTES,
+                file_name="system_design_template.mmd",
+                mime="text/plain"
+            )
+        else:
+            try:
+                mermaid_data = cached_mmd(diagram)
+                st.download_button(
+                    "Download as Mermaid",
+                    data=mermaid_data,
+                    file_name="flow_diagram.mmd",
+                    mime="text/plain"
+                )
+            except Exception as e:
+                st.error(f"Mermaid export error: {str(e)}")
+
 # Main application UI
 def main():
     """Main application interface"""
@@ -175,8 +341,7 @@ def main():
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Get Ollama client and diagram generator
-        ollama_client = get_ollama_client()
+        # Get diagram generator
         diagram_generator = get_diagram_generator()
         
         # Show assistant response
@@ -188,10 +353,11 @@ def main():
             try:
                 # Get response from Ollama
                 with st.spinner("Thinking..."):
-                    response = ollama_client.generate_flow_description(prompt)
+                    response = generate_diagram_spec(prompt, st.session_state.ollama_model)
                 
-                # Generate diagram
+                # Generate diagram, releasing the previous one first
                 with st.spinner("Creating diagram..."):
+                    st.session_state.current_diagram = None
                     diagram = diagram_generator.generate(response)
                     st.session_state.current_diagram = diagram
                 
@@ -217,95 +383,12 @@ def main():
     
     # Display diagram if it exists
     if st.session_state.current_diagram:
-        st.markdown("<div class='sub-header'>Flow Diagram</div>", unsafe_allow_html=True)
-        
-        diagram_container = st.container()
-        with diagram_container:
-            st.markdown("<div class='diagram-container'>", unsafe_allow_html=True)
-            
-            if diagram_type == "Interactive":
-                # Show with or without animation based on settings
-                if st.session_state.animation_enabled:
-                    animate_diagram(
-                        st.session_state.current_diagram, 
-                        speed=st.session_state.animation_speed,
-                        container=diagram_container
-                    )
-                else:
-                    diagram_generator.display(st.session_state.current_diagram)
-            elif diagram_type == "Mermaid":
-                display_mermaid(st.session_state.current_diagram)
-            else:  # System Design Template
-                display_system_design_template(container=diagram_container)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Export options
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            try:
-                png_data = diagram_generator.export_as_png(st.session_state.current_diagram)
-                st.download_button(
-                    "Download as PNG",
-                    data=png_data,
-                    file_name="flow_diagram.png",
-                    mime="image/png"
-                )
-            except Exception as e:
-                st.error(f"PNG export error: {str(e)}")
-                
-        with col2:
-            try:
-                svg_data = diagram_generator.export_as_svg(st.session_state.current_diagram)
-                st.download_button(
-                    "Download as SVG",
-                    data=svg_data,
-                    file_name="flow_diagram.svg",
-                    mime="image/svg+xml"
-                )
-            except Exception as e:
-                st.error(f"SVG export error: {str(e)}")
-                
-        with col3:
-            try:
-                from src.gif_export import export_as_gif
-                
-                animation_duration = st.session_state.get("animation_duration", 5.0)
-                
-                gif_data = export_as_gif(
-                    st.session_state.current_diagram,
-                    duration=animation_duration,
-                    fps=10
-                )
-                
-                st.download_button(
-                    "Download as GIF",
-                    data=gif_data,
-                    file_name="flow_diagram.gif",
-                    mime="image/gif"
-                )
-            except Exception as e:
-                st.error(f"GIF export error: {str(e)}")
-                
-        with col4:
-            if diagram_type == "System Design Template":
-                st.download_button(
-                    "Download Template",
-                    data=get_system_design_template(),
-                    file_name="system_design_template.mmd",
-                    mime="text/plain"
-                )
-            else:
-                try:
-                    mermaid_data = export_mermaid(st.session_state.current_diagram)
-                    st.download_button(
-                        "Download as Mermaid",
-                        data=mermaid_data,
-                        file_name="flow_diagram.mmd",
-                        mime="text/plain"
-                    )
-                except Exception as e:
-                    st.error(f"Mermaid export error: {str(e)}")
+        render_diagram_fragment(
+            st.session_state.current_diagram,
+            st.session_state.animation_enabled,
+            st.session_state.animation_speed,
+            diagram_type
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -30,7 +30,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=[
-        "streamlit>=1.18.0",
+        "streamlit>=1.37.0",
         "python-dotenv>=0.19.0",
         "requests>=2.28.0",
         "pydantic>=1.10.0",
@@ -1,18 +1,40 @@
 """
 Animation Module - Functions for animating flow diagrams
 """
-import time
+import functools
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-from typing import Dict, Any, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Union, Container
 import uuid
-import networkx as nx
+
+from src.animation_kernels import build_default_anim
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Color used for highlighted nodes and edges
+HIGHLIGHT_COLOR = "#FF9800"
+
+@functools.lru_cache(maxsize=1)
+def _plotly():
+    """
+    Import Plotly's graph objects on first use, so importing the renderers
+    (e.g. in GIF export workers) doesn't load Plotly
+    
+    Returns:
+        module: plotly.graph_objects
+    """
+    import plotly.graph_objects as go
+    return go
 
 def animate_diagram(diagram_data: Dict[str, Any], speed: float = 1.0, container: Optional[st.container] = None) -> None:
     """
     Animate a flow diagram
     
+    Every animation step is precomputed as a Plotly frame and the figure is
+    sent once; playback (Play button and step slider) runs in the browser.
+    The figure initially shows the complete diagram.
+    
     Args:
         diagram_data: Enriched diagram data with layout information
         speed: Animation speed multiplier (lower is slower)
@@ -21,10 +43,14 @@ def animate_diagram(diagram_data: Dict[str, Any], speed: float = 1.0, container:
     # Get the display container
     if container is None:
         container = st
+    go = _plotly()
     
-    # Get the graph and layout
-    G = diagram_data["graph"]
-    pos = {node: diagram_data["layout"][node] for node in G.nodes()}
+    # Get the SoA arrays and index maps
+    soa = diagram_data["soa"]
+    node_xy = soa["node_xy"]
+    edge_ends = soa["edge_idx"]
+    node_idx = diagram_data["_node_idx"]
+    edge_idx = diagram_data["_edge_idx"]
     
     # Get animation sequence
     animations = diagram_data.get("animations", [])
@@ -36,15 +62,22 @@ def animate_diagram(diagram_data: Dict[str, Any], speed: float = 1.0, container:
     # Sort animations by order
     animations.sort(key=lambda x: x.get("order", 0))
     
-    # Create a placeholder for the figure
-    fig_placeholder = container.empty()
+    # Clone the cached figure skeleton; hidden elements have NaN coordinates
+    fig = go.Figure(_build_base_figure(diagram_data["_hash"], diagram_data))
+    trace_names = [trace.name for trace in fig.data]
+    trace_edges = {
+        trace.name: np.asarray(trace.meta, dtype=np.int32)
+        for trace in fig.data if trace.name != "nodes"
+    }
     
-    # Execute animations
-    visible_nodes = set()
-    visible_edges = set()
-    highlighted_nodes = set()
-    highlighted_edges = set()
-    pulsing_nodes = set()
+    # Track animation state as boolean masks over the SoA node/edge arrays
+    state = {
+        "visible_nodes": np.zeros(len(node_xy), dtype=bool),
+        "highlighted_nodes": np.zeros(len(node_xy), dtype=bool),
+        "enlarged_nodes": np.zeros(len(node_xy), dtype=bool),
+        "drawn_edges": np.zeros(len(edge_ends), dtype=bool),
+        "highlighted_edges": np.zeros(len(edge_ends), dtype=bool)
+    }
     
     # Group animations by order for simultaneous effects
     animation_groups = {}
@@ -54,75 +87,69 @@ def animate_diagram(diagram_data: Dict[str, Any], speed: float = 1.0, container:
             animation_groups[order] = []
         animation_groups[order].append(anim)
     
-    # Process animation groups in order
+    # Process animation groups in order, recording one frame per group
+    frames = []
+    durations = []
     for order in sorted(animation_groups.keys()):
         group = animation_groups[order]
         
-        # Generate a unique key for this animation frame
-        frame_key = f"animation_frame_{order}_{uuid.uuid4().hex[:8]}"
-        
         # Apply all animations in the group
         for anim in group:
-            element = anim.get("element", "")
+            kind, target = _animation_target(anim, node_idx)
             effect = anim.get("effect", "")
             
             # Handle node animations
-            if element in G.nodes():
-                if effect == "fadeIn":
-                    visible_nodes.add(element)
-                elif effect == "highlight":
-                    visible_nodes.add(element)
-                    highlighted_nodes.add(element)
-                elif effect == "pulse":
-                    visible_nodes.add(element)
-                    pulsing_nodes.add(element)
+            if kind == "node":
+                i = node_idx[target]
+                if effect in ("fadeIn", "highlight", "pulse"):
+                    state["visible_nodes"][i] = True
+                if effect == "highlight":
+                    state["highlighted_nodes"][i] = True
+                if effect in ("highlight", "pulse"):
+                    state["enlarged_nodes"][i] = True
             
             # Handle edge animations
-            elif element.startswith("edge_"):
-                parts = element.split("_")[1:]
-                if len(parts) >= 2:
-                    from_node, to_node = parts[0], parts[1]
-                    edge = (from_node, to_node)
-                    
-                    if edge in G.edges() or (to_node, from_node) in G.edges():
-                        if effect == "draw" or effect == "fadeIn":
-                            visible_edges.add(edge)
-                        elif effect == "highlight":
-                            visible_edges.add(edge)
-                            highlighted_edges.add(edge)
+            elif kind == "edge":
+                i = edge_idx.get(target, edge_idx.get(target[::-1]))
+                
+                if i is not None and effect in ("draw", "fadeIn", "highlight"):
+                    mask = "highlighted_edges" if effect == "highlight" else "drawn_edges"
+                    state[mask][i] = True
         
-        # Render the current state
-        fig = _create_animated_figure(
-            diagram_data, 
-            visible_nodes, 
-            visible_edges, 
-            highlighted_nodes, 
-            highlighted_edges,
-            pulsing_nodes
-        )
-        fig_placeholder.plotly_chart(fig, use_container_width=True, key=frame_key)
+        frames.append(go.Frame(
+            name=str(order),
+            data=_frame_data(trace_names, trace_edges, soa, state),
+            traces=list(range(len(trace_names)))
+        ))
         
-        # Wait based on animation duration and speed
+        # Hold each frame based on animation duration and speed
         duration = max([anim.get("duration", 0.8) for anim in group])
-        time.sleep(duration / speed)
-    
-    # Final render with everything visible - use a unique key
-    final_key = f"animation_final_{uuid.uuid4().hex[:8]}"
-    visible_nodes = set(G.nodes())
-    visible_edges = set(G.edges())
-    highlighted_nodes = set()
-    highlighted_edges = set()
-    pulsing_nodes = set()
-    
-    fig = _create_animated_figure(
-        diagram_data, 
-        visible_nodes, 
-        visible_edges, 
-        highlighted_nodes, 
-        highlighted_edges,
-        pulsing_nodes
+        durations.append(duration / speed)
+    
+    # Final state with everything visible, also used as the initial view
+    final_state = {
+        "visible_nodes": np.ones(len(node_xy), dtype=bool),
+        "highlighted_nodes": np.zeros(len(node_xy), dtype=bool),
+        "enlarged_nodes": np.zeros(len(node_xy), dtype=bool),
+        "drawn_edges": np.ones(len(edge_ends), dtype=bool),
+        "highlighted_edges": np.zeros(len(edge_ends), dtype=bool)
+    }
+    final_data = _frame_data(trace_names, trace_edges, soa, final_state)
+    with fig.batch_update():
+        for trace, data in zip(fig.data, final_data):
+            trace.update(data)
+    frames.append(go.Frame(name="final", data=final_data, traces=list(range(len(trace_names)))))
+    durations.append(0)
+    
+    fig.frames = frames
+    fig.update_layout(
+        updatemenus=[_play_button(frames, durations)],
+        sliders=[_step_slider(frames)]
     )
-    fig_placeholder.plotly_chart(fig, use_container_width=True, key=final_key)
+    
+    # Reuse one chart key per session so reruns update the chart in place
+    chart_key = f"animation_{st.session_state.setdefault('_anim_nonce', uuid.uuid4().hex[:8])}"
+    container.plotly_chart(fig, use_container_width=True, key=chart_key)
 
 def _create_default_animations(diagram_data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -134,160 +161,293 @@ def _create_default_animations(diagram_data: Dict[str, Any]) -> List[Dict[str, A
     Returns:
         List[Dict[str, Any]]: List of animation instructions
     """
-    animations = []
     G = diagram_data["graph"]
+    csr = diagram_data["csr"]
+    nodes = list(G.nodes())
+    edge_ends = diagram_data["soa"]["edge_idx"]
+    topo_order = diagram_data["topo_order"]
     
-    # Get topological ordering of nodes if possible
-    try:
-        node_order = list(nx.topological_sort(G))
-    except:
-        # Fall back to original order if graph has cycles
-        node_order = list(G.nodes())
+    # Enumerate node and edge appearances over the CSR arrays
+    total = len(nodes) + len(edge_ends)
+    out_elem = np.empty(total, dtype=np.int32)
+    out_order = np.empty(total, dtype=np.int32)
+    out_duration = np.empty(total, dtype=np.float64)
+    count = build_default_anim(topo_order, csr["indptr"], out_elem, out_order, out_duration)
     
-    # Create node appearance animations
-    for i, node in enumerate(node_order):
+    # Convert back to animation instructions
+    animations = []
+    for k, (elem, order, duration) in enumerate(zip(out_elem[:count].tolist(), out_order[:count].tolist(), out_duration[:count].tolist())):
+        if k < len(nodes):
+            kind, target = "node", nodes[elem]
+            element = target
+            effect = "fadeIn"
+        else:
+            from_idx, to_idx = edge_ends[csr["edges"][elem]]
+            kind, target = "edge", (nodes[from_idx], nodes[to_idx])
+            element = f"edge_{target[0]}_{target[1]}"
+            effect = "draw"
+        
+        # Keep the resolved target next to the element string, so consumers
+        # don't have to parse the string back
         animations.append({
-            "element": node,
-            "effect": "fadeIn",
-            "duration": 0.5,
-            "order": i + 1
+            "element": element,
+            "target_kind": kind,
+            "target": target,
+            "effect": effect,
+            "duration": duration,
+            "order": order
         })
     
-    # Create edge appearance animations
-    edge_i = 0
-    for i, node in enumerate(node_order[:-1]):
-        for successor in G.successors(node):
-            edge_i += 1
-            animations.append({
-                "element": f"edge_{node}_{successor}",
-                "effect": "draw",
-                "duration": 0.3,
-                "order": len(node_order) + edge_i
-            })
-    
     return animations
 
-def _create_animated_figure(
-    diagram_data: Dict[str, Any],
-    visible_nodes: set,
-    visible_edges: set,
-    highlighted_nodes: set,
-    highlighted_edges: set,
-    pulsing_nodes: set
-) -> go.Figure:
+def _animation_target(anim: Dict[str, Any], nodes: Container) -> tuple:
     """
-    Create a Plotly figure for the current animation state
+    Resolve the node or edge an animation applies to
+    
+    Uses the pre-resolved target of default animations when present, and
+    otherwise parses the element string ("<node>" or "edge_<from>_<to>").
     
     Args:
-        diagram_data: Enriched diagram data
-        visible_nodes: Set of currently visible nodes
-        visible_edges: Set of currently visible edges
-        highlighted_nodes: Set of highlighted nodes
-        highlighted_edges: Set of highlighted edges
-        pulsing_nodes: Set of pulsing nodes
+        anim: Animation instruction
+        nodes: Node ids of the diagram
         
     Returns:
-        go.Figure: Plotly figure
+        tuple: ("node", node_id), ("edge", (from_node, to_node)), or
+            (None, None) if the element matches neither
     """
-    G = diagram_data["graph"]
-    pos = {node: diagram_data["layout"][node] for node in G.nodes()}
+    if "target_kind" in anim:
+        kind, target = anim["target_kind"], anim["target"]
+        if kind == "edge" or target in nodes:
+            return kind, target
+        return None, None
     
-    # Create figure
-    fig = go.Figure()
+    element = anim.get("element", "")
+    if element in nodes:
+        return "node", element
+    if element.startswith("edge_"):
+        parts = element.split("_")[1:]
+        if len(parts) >= 2:
+            return "edge", (parts[0], parts[1])
+    return None, None
+
+def _segments(node_xy: np.ndarray, ends: np.ndarray, visible: Union[bool, np.ndarray] = True) -> tuple:
+    """
+    Build NaN-separated line coordinates for a set of edges
     
-    # Add visible edges
-    for edge in G.edges():
-        if edge not in visible_edges:
-            continue
-            
-        from_node, to_node = edge
-        x0, y0 = pos[from_node]
-        x1, y1 = pos[to_node]
+    Args:
+        node_xy: Node positions, shape (N, 2)
+        ends: Edge endpoint indices, shape (E, 2)
+        visible: Whether to fill in the segments or leave them hidden,
+            either for all edges or as a per-edge boolean mask
         
-        edge_data = G.edges[edge]
+    Returns:
+        tuple: (x, y) coordinate arrays of length 3 * E
+    """
+    xs = np.full(3 * len(ends), np.nan, dtype=node_xy.dtype)
+    ys = np.full(3 * len(ends), np.nan, dtype=node_xy.dtype)
+    if len(ends):
+        xs[0::3], ys[0::3] = node_xy[ends[:, 0]].T
+        xs[1::3], ys[1::3] = node_xy[ends[:, 1]].T
         
-        # Determine if edge is highlighted
-        is_highlighted = edge in highlighted_edges
+        # Blank out hidden segments, keeping the NaN separators in place
+        hidden = ~np.broadcast_to(visible, len(ends))
+        xs.reshape(-1, 3)[hidden] = np.nan
+        ys.reshape(-1, 3)[hidden] = np.nan
+    return xs, ys
+
+def _frame_data(
+    trace_names: List[str],
+    trace_edges: Dict[str, np.ndarray],
+    soa: Dict[str, np.ndarray],
+    state: Dict[str, np.ndarray]
+) -> List[Dict[str, Any]]:
+    """
+    Build per-trace frame data for an animation state
+    
+    Args:
+        trace_names: Names of the figure's traces, in trace order
+        trace_edges: Edge indices drawn by each edge and edge label trace
+        soa: SoA node and edge arrays of the diagram
+        state: Boolean node/edge masks of the current animation state
         
-        # Create edge line with appropriate styling
-        line_color = "#FF9800" if is_highlighted else edge_data.get("color", "#333")
-        line_width = edge_data.get("width", 1.5) * (2 if is_highlighted else 1)
+    Returns:
+        List[Dict[str, Any]]: One partial trace update per trace
+    """
+    node_xy = soa["node_xy"]
+    edge_ends = soa["edge_idx"]
+    shown_edges = state["drawn_edges"] | state["highlighted_edges"]
+    
+    data = []
+    for name in trace_names:
+        if name == "nodes":
+            # Hidden nodes get NaN positions; highlighted ones change color
+            node_pos = np.where(state["visible_nodes"][:, None], node_xy, np.nan).astype(node_xy.dtype)
+            node_colors = np.where(state["highlighted_nodes"], HIGHLIGHT_COLOR, soa["node_color"])
+            node_sizes = np.where(state["enlarged_nodes"], soa["node_size"] * 1.5, soa["node_size"])
+            data.append(dict(
+                type="scatter",
+                x=node_pos[:, 0],
+                y=node_pos[:, 1],
+                marker=dict(color=node_colors.tolist(), size=node_sizes.astype(node_xy.dtype))
+            ))
+        elif name == "edge_labels":
+            # Labels sit at the midpoints of edges that have been revealed
+            edges = trace_edges[name]
+            mids = soa["edge_mid"][edges]
+            mids[~shown_edges[edges]] = np.nan
+            data.append(dict(type="scatter", x=mids[:, 0], y=mids[:, 1]))
+        else:
+            # Highlight overlays show highlighted edges, base traces drawn ones
+            edges = trace_edges[name]
+            mask = state["highlighted_edges"] if name.endswith("_highlight") else state["drawn_edges"]
+            xs, ys = _segments(node_xy, edge_ends[edges], mask[edges])
+            data.append(dict(type="scatter", x=xs, y=ys))
+    return data
+
+def _play_button(frames: List["go.Frame"], durations: List[float]) -> Dict[str, Any]:
+    """
+    Build the Play button that runs the frames in the browser
+    
+    Args:
+        frames: Animation frames
+        durations: Seconds to hold each frame
+        
+    Returns:
+        Dict[str, Any]: Plotly updatemenu definition
+    """
+    return dict(
+        type="buttons",
+        showactive=False,
+        x=0,
+        y=0,
+        xanchor="left",
+        yanchor="top",
+        buttons=[dict(
+            label="Play",
+            method="animate",
+            args=[
+                [frame.name for frame in frames],
+                dict(
+                    frame=[dict(duration=int(duration * 1000), redraw=True) for duration in durations],
+                    transition=dict(duration=0),
+                    mode="immediate"
+                )
+            ]
+        )]
+    )
+
+def _step_slider(frames: List["go.Frame"]) -> Dict[str, Any]:
+    """
+    Build the slider for stepping through the frames
+    
+    Args:
+        frames: Animation frames
+        
+    Returns:
+        Dict[str, Any]: Plotly slider definition
+    """
+    return dict(
+        active=len(frames) - 1,
+        x=0.1,
+        len=0.9,
+        currentvalue=dict(visible=False),
+        steps=[dict(
+            label=frame.name,
+            method="animate",
+            args=[[frame.name], dict(frame=dict(duration=0, redraw=True), transition=dict(duration=0), mode="immediate")]
+        ) for frame in frames]
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _build_base_figure(diagram_hash: str, _diagram_data: Dict[str, Any]) -> "go.Figure":
+    """
+    Build the animation figure with every element pre-allocated but hidden
+    
+    Nodes share a single marker trace and edges share one line trace per
+    style (plus a highlight overlay), using NaN separators between
+    segments. Hidden elements have NaN coordinates. The figure is shared
+    between reruns, so callers must clone it before patching.
+    
+    Args:
+        diagram_hash: Content hash of the diagram, used as the cache key
+        _diagram_data: Enriched diagram data (not hashed)
+        
+    Returns:
+        go.Figure: Plotly figure
+    """
+    go = _plotly()
+    diagram_data = _diagram_data
+    soa = diagram_data["soa"]
+    node_xy = soa["node_xy"]
+    edge_ends = soa["edge_idx"]
+    
+    # Create figure
+    fig = go.Figure()
+    
+    # Add one edge trace per line style, with highlight overlays drawn above all of them
+    overlays = []
+    for g, ((color, width, dash), group) in enumerate(diagram_data["edge_groups"].items()):
+        xs, ys = _segments(node_xy, edge_ends[group], visible=False)
+        labels = np.repeat(soa["edge_label"][group], 3).tolist()
         
         fig.add_trace(go.Scatter(
-            x=[x0, x1],
-            y=[y0, y1],
+            x=xs,
+            y=ys,
             mode='lines',
-            line=dict(
-                color=line_color,
-                width=line_width,
-                dash='solid' if edge_data.get("style", "solid") == "solid" else 'dash'
-            ),
+            line=dict(color=color, width=width, dash=dash),
             hoverinfo='text',
-            text=edge_data.get("label", ""),
+            text=labels,
+            name=f"edges_{g}",
+            meta=group,
             showlegend=False
         ))
-        
-        # Add edge label if it exists
-        if "label" in edge_data and edge_data["label"]:
-            mid_x = (x0 + x1) / 2
-            mid_y = (y0 + y1) / 2
-            
-            fig.add_annotation(
-                x=mid_x,
-                y=mid_y,
-                text=edge_data["label"],
-                showarrow=False,
-                font=dict(size=10),
-                bgcolor="rgba(255, 255, 255, 0.8)",
-                bordercolor="#333",
-                borderwidth=1
-            )
-    
-    # Add visible nodes
-    for node in G.nodes():
-        if node not in visible_nodes:
-            continue
-            
-        x, y = pos[node]
-        node_data = G.nodes[node]
-        node_type = node_data.get("node_type", "process")
-        
-        # Determine if node is highlighted or pulsing
-        is_highlighted = node in highlighted_nodes
-        is_pulsing = node in pulsing_nodes
-        
-        # Adjust color and size based on highlight/pulse state
-        base_color = node_data.get("color", "#4285F4")
-        color = "#FF9800" if is_highlighted else base_color
-        size_multiplier = 1.5 if is_highlighted or is_pulsing else 1.0
-        
-        # Create different shapes based on node type
-        if node_type == "decision":
-            marker_symbol = "diamond"
-            marker_size = 15 * size_multiplier
-        elif node_type in ["start", "end"]:
-            marker_symbol = "circle"
-            marker_size = 12 * size_multiplier
-        else:
-            marker_symbol = "square"
-            marker_size = 14 * size_multiplier
-        
-        fig.add_trace(go.Scatter(
-            x=[x],
-            y=[y],
-            mode='markers+text',
-            marker=dict(
-                symbol=marker_symbol,
-                size=marker_size,
-                color=color,
-                line=dict(width=1, color='#333')
-            ),
-            text=node_data.get("label", node),
-            textposition="middle center",
+        overlays.append(go.Scatter(
+            x=xs,
+            y=ys,
+            mode='lines',
+            line=dict(color=HIGHLIGHT_COLOR, width=width * 2, dash=dash),
             hoverinfo='text',
-            hovertext=node_data.get("description", ""),
+            text=labels,
+            name=f"edges_{g}_highlight",
+            meta=group,
             showlegend=False
         ))
+    fig.add_traces(overlays)
+    
+    # Add edge labels as one text trace, revealed with their edge
+    labeled = np.flatnonzero(soa["edge_label"] != "").astype(np.int32)
+    hidden = np.full(len(labeled), np.nan, dtype=node_xy.dtype)
+    fig.add_trace(go.Scatter(
+        x=hidden,
+        y=hidden,
+        mode='text',
+        text=soa["edge_label"][labeled].tolist(),
+        textfont=dict(size=10),
+        hoverinfo='skip',
+        name="edge_labels",
+        meta=labeled,
+        showlegend=False
+    ))
+    
+    # Add a single node trace with per-point styling
+    hidden = np.full(len(node_xy), np.nan, dtype=node_xy.dtype)
+    fig.add_trace(go.Scatter(
+        x=hidden,
+        y=hidden,
+        mode='markers+text',
+        marker=dict(
+            symbol=soa["node_symbol"].tolist(),
+            size=soa["node_size"],
+            color=soa["node_color"].tolist(),
+            line=dict(width=1, color='#333')
+        ),
+        text=soa["node_label"].tolist(),
+        textposition="middle center",
+        hoverinfo='text',
+        hovertext=soa["node_description"].tolist(),
+        name="nodes",
+        showlegend=False
+    ))
     
     # Configure layout
     fig.update_layout(
@@ -300,4 +460,4 @@ def _create_animated_figure(
         plot_bgcolor='white'
     )
     
-    return fig
\ No newline at end of file
+    return fig
@@ -0,0 +1,57 @@
+"""
+Animation Kernels - Compiled loops over the diagram's index arrays
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional; without it the kernels run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Default animation durations (seconds)
+NODE_DURATION = 0.5
+EDGE_DURATION = 0.3
+
+@njit(cache=True)
+def build_default_anim(
+    topo_order: np.ndarray,
+    indptr: np.ndarray,
+    out_elem: np.ndarray,
+    out_order: np.ndarray,
+    out_duration: np.ndarray
+) -> int:
+    """
+    Fill the default animation sequence: every node in topological order,
+    then the outgoing edges of every node but the last
+    
+    Args:
+        topo_order: Node indices in topological order, shape (N,)
+        indptr: CSR row pointers of the adjacency matrix, shape (N + 1,)
+        out_elem: Output element ids; the first N entries are node indices,
+            the rest are CSR positions of edges
+        out_order: Output animation order of each entry
+        out_duration: Output duration of each entry
+        
+    Returns:
+        int: Number of entries written
+    """
+    n = topo_order.shape[0]
+    for i in range(n):
+        out_elem[i] = topo_order[i]
+        out_order[i] = i + 1
+        out_duration[i] = NODE_DURATION
+    
+    k = n
+    for i in range(n - 1):
+        u = topo_order[i]
+        for j in range(indptr[u], indptr[u + 1]):
+            out_elem[k] = j
+            out_order[k] = k + 1
+            out_duration[k] = EDGE_DURATION
+            k += 1
+    
+    return k
@@ -36,10 +36,7 @@ class Config:
         Returns:
             Dict[str, Any]: Configuration as dictionary
         """
-        return {
-            key: value for key, value in cls.__dict__.items()
-            if not key.startswith("__") and not callable(value)
-        }
+        return dict(_CONFIG_SNAPSHOT)
     
     @classmethod
     def get(cls, key: str, default: Any = None) -> Any:
@@ -53,8 +50,26 @@ class Config:
         Returns:
             Any: Configuration value
         """
-        return getattr(cls, key, default)
+        return _CONFIG_SNAPSHOT.get(key, default)
+    
+    @classmethod
+    def set(cls, key: str, value: Any) -> None:
+        """
+        Set configuration value, keeping the cached snapshot in sync
+        
+        Args:
+            key: Configuration key
+            value: New configuration value
+        """
+        setattr(cls, key, value)
+        _CONFIG_SNAPSHOT[key] = value
 
+# Configuration values, collected once at import; methods are excluded
+_CONFIG_SNAPSHOT: Dict[str, Any] = {
+    key: value for key, value in vars(Config).items()
+    if not key.startswith("__") and not callable(value)
+    and not isinstance(value, (classmethod, staticmethod))
+}
 
 # Create cache directory if it doesn't exist
 Config.CACHE_DIR.mkdir(exist_ok=True, parents=True)
\ No newline at end of file
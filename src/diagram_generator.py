@@ -2,17 +2,101 @@
 Diagram Generator - Module for generating flow diagrams
 """
 import io
-import base64
-from typing import Dict, Any, List, Optional, Union
+import json
+import shutil
+import hashlib
+import functools
+import inspect
+from typing import Dict, Any, List
 import logging
+from collections.abc import Mapping
 import streamlit as st
 import networkx as nx
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.path import Path
-import plotly.graph_objects as go
 import numpy as np
 
+from src.animation import _segments, _plotly
+
+try:
+    import pydot  # noqa: F401
+    _HAS_PYDOT = True
+except ImportError:
+    # pydot is optional; without it the dot layout fallback is skipped
+    _HAS_PYDOT = False
+
+# pydot only drives Graphviz; the dot layout also needs the dot binary
+_HAS_DOT = _HAS_PYDOT and shutil.which("dot") is not None
+
+try:
+    import scipy.optimize  # noqa: F401
+    _HAS_SCIPY = True
+except ImportError:
+    _HAS_SCIPY = False
+
+# NetworkX 3.5+ can minimize the Fruchterman-Reingold energy with SciPy's
+# L-BFGS instead of iterating fixed force steps; it needs far fewer steps
+# on large graphs. Older releases and installs without SciPy skip it.
+_HAS_ENERGY_LAYOUT = _HAS_SCIPY and "method" in inspect.signature(nx.spring_layout).parameters
+
+# Graphs above this size that fall back to a spring layout minimize its energy
+ENERGY_LAYOUT_MIN_NODES = 200
+
+@functools.lru_cache(maxsize=128)
+def _layout_for(nodes: tuple, edges: tuple) -> Dict[str, List[float]]:
+    """
+    Calculate layout positions for a graph structure
+    
+    Args:
+        nodes: (node_id, node_type) pairs in graph order
+        edges: (from_node, to_node) pairs in graph order
+        
+    Returns:
+        Dict[str, List[float]]: Node positions {node_id: [x, y]}
+    """
+    G = nx.DiGraph()
+    G.add_nodes_from((node, {"node_type": node_type}) for node, node_type in nodes)
+    G.add_edges_from(edges)
+    
+    # Use hierarchical layout for flow diagrams when every node has a type,
+    # then dot layout if Graphviz is available, then a spring layout
+    if nodes and all(node_type is not None for _, node_type in nodes):
+        pos = nx.multipartite_layout(G, subset_key="node_type")
+    elif nodes and _HAS_DOT:
+        pos = nx.nx_pydot.graphviz_layout(G, prog="dot")
+    elif _HAS_ENERGY_LAYOUT and len(nodes) > ENERGY_LAYOUT_MIN_NODES:
+        # Large graphs minimize the spring energy instead of stepping forces
+        pos = nx.spring_layout(G, method="energy")
+    else:
+        pos = nx.spring_layout(G)
+    
+    # Quantize to 3 decimals; more precision is invisible on screen and
+    # only lengthens every serialized coordinate
+    xy = np.asarray([pos[node] for node, _ in nodes], dtype=np.float64).reshape(-1, 2).round(3)
+    return dict(zip((node for node, _ in nodes), xy.tolist()))
+
+class NodePositions(Mapping):
+    """Read-only {node_id: (x, y)} view over the SoA node position array"""
+    
+    def __init__(self, node_idx: Dict[str, int], node_xy: np.ndarray):
+        """
+        Initialize the view
+        
+        Args:
+            node_idx: Node position in the arrays {node_id: index}
+            node_xy: Node positions, shape (N, 2)
+        """
+        self._node_idx = node_idx
+        self._node_xy = node_xy
+    
+    def __getitem__(self, node: str) -> np.ndarray:
+        return self._node_xy[self._node_idx[node]]
+    
+    def __iter__(self):
+        return iter(self._node_idx)
+    
+    def __len__(self) -> int:
+        return len(self._node_idx)
+
 class DiagramGenerator:
     """Generator for flow diagrams from structured data"""
     
@@ -37,6 +121,14 @@ class DiagramGenerator:
             "feedback": {"style": "dotted", "color": "#9C27B0", "width": 1.5},
             "default": {"style": "solid", "color": "#333333", "width": 1.5}
         }
+        
+        # Plotly marker styling per node type (symbol, size)
+        self.marker_styles = {
+            "decision": ("diamond", 15),
+            "start": ("circle", 12),
+            "end": ("circle", 12),
+            "default": ("square", 14)
+        }
     
     def generate(self, diagram_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -83,11 +175,128 @@ class DiagramGenerator:
         
         # Add layout to diagram data
         enriched_data = diagram_data.copy()
+        enriched_data["_hash"] = hashlib.blake2b(
+            json.dumps(diagram_data, sort_keys=True, default=str).encode()
+        ).hexdigest()
         enriched_data["layout"] = layout
         enriched_data["graph"] = G
         
+        # Index maps so renderers can address nodes/edges by trace position
+        enriched_data["_node_idx"] = {node: i for i, node in enumerate(G.nodes())}
+        enriched_data["_edge_idx"] = {edge: i for i, edge in enumerate(G.edges())}
+        
+        # Parallel NumPy arrays (SoA) for the renderers' hot paths
+        soa = self._build_soa(G, layout, enriched_data["_node_idx"])
+        enriched_data["soa"] = soa
+        enriched_data["csr"] = self._build_csr(soa["edge_idx"], G.number_of_nodes())
+        enriched_data["edge_groups"] = self._group_edges(soa)
+        
+        # Node ids and colors grouped by node type, fixed once the graph is built
+        node_groups = {}
+        for node, node_type in G.nodes(data="node_type"):
+            node_groups.setdefault(node_type, []).append(node)
+        enriched_data["node_groups"] = node_groups
+        enriched_data["node_colors_by_group"] = {
+            node_type: soa["node_color"][[enriched_data["_node_idx"][n] for n in nodes]].tolist()
+            for node_type, nodes in node_groups.items()
+        }
+        
+        # Position mapping for networkx drawing, backed by the SoA array
+        enriched_data["pos"] = NodePositions(enriched_data["_node_idx"], enriched_data["soa"]["node_xy"])
+        
+        # Topological order of the nodes, shared by every animation consumer
+        try:
+            node_order = list(nx.topological_sort(G))
+        except nx.NetworkXUnfeasible:
+            # Fall back to original order if graph has cycles
+            node_order = list(G.nodes())
+        enriched_data["topo_order"] = np.asarray(
+            [enriched_data["_node_idx"][node] for node in node_order], dtype=np.int32
+        )
+        
         return enriched_data
     
+    def _build_csr(self, edge_idx: np.ndarray, num_nodes: int) -> Dict[str, np.ndarray]:
+        """
+        Build the CSR adjacency of the graph from its edge index array
+        
+        Args:
+            edge_idx: Edge endpoint indices, shape (E, 2)
+            num_nodes: Number of nodes in the graph
+            
+        Returns:
+            Dict[str, np.ndarray]: Row pointers, column indices and the edge
+            index stored at each CSR position
+        """
+        # Stable sort keeps successors in insertion order, like G.successors()
+        order = np.argsort(edge_idx[:, 0], kind="stable").astype(np.int32)
+        counts = np.bincount(edge_idx[:, 0], minlength=num_nodes)
+        
+        return {
+            "indptr": np.concatenate(([0], np.cumsum(counts))).astype(np.int32),
+            "indices": edge_idx[order, 1],
+            "edges": order
+        }
+    
+    def _group_edges(self, soa: Dict[str, np.ndarray]) -> Dict[tuple, np.ndarray]:
+        """
+        Group edges by line style, so each style can be drawn as one trace
+        
+        Args:
+            soa: SoA node and edge arrays of the diagram
+            
+        Returns:
+            Dict[tuple, np.ndarray]: Edge indices keyed by (color, width, dash)
+        """
+        edge_groups = {}
+        styles = zip(soa["edge_color"].tolist(), soa["edge_width"].tolist(), soa["edge_dash"].tolist())
+        for i, style in enumerate(styles):
+            edge_groups.setdefault(style, []).append(i)
+        
+        return {style: np.asarray(group, dtype=np.int32) for style, group in edge_groups.items()}
+    
+    def _build_soa(self, G: nx.DiGraph, layout: Dict[str, List[float]], node_idx: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """
+        Build structure-of-arrays views of node and edge attributes
+        
+        Args:
+            G: NetworkX graph
+            layout: Node positions {node_id: [x, y]}
+            node_idx: Node position in G.nodes() {node_id: index}
+            
+        Returns:
+            Dict[str, np.ndarray]: Arrays indexed by node/edge position in G
+        """
+        nodes = list(G.nodes(data=True))
+        edges = list(G.edges(data=True))
+        markers = [
+            self.marker_styles.get(data.get("node_type"), self.marker_styles["default"])
+            for _, data in nodes
+        ]
+        
+        soa = {
+            "node_xy": np.asarray([layout[node] for node, _ in nodes], dtype=np.float32).reshape(-1, 2),
+            "node_color": np.asarray([data.get("color", "#4285F4") for _, data in nodes], dtype=str),
+            "node_symbol": np.asarray([symbol for symbol, _ in markers], dtype=str),
+            "node_size": np.asarray([size for _, size in markers], dtype=np.float32),
+            "node_label": np.asarray([data.get("label", node) for node, data in nodes], dtype=object),
+            "node_description": np.asarray([data.get("description", "") for _, data in nodes], dtype=object),
+            "edge_idx": np.asarray([[node_idx[u], node_idx[v]] for u, v, _ in edges], dtype=np.int32).reshape(-1, 2),
+            "edge_color": np.asarray([data.get("color", "#333") for _, _, data in edges], dtype=str),
+            "edge_width": np.asarray([data.get("width", 1.5) for _, _, data in edges], dtype=np.float32),
+            "edge_style": np.asarray([data.get("style", "solid") for _, _, data in edges], dtype=str),
+            "edge_label": np.asarray([data.get("label", "") for _, _, data in edges], dtype=object)
+        }
+        
+        # Plotly dash of each edge
+        soa["edge_dash"] = np.where(soa["edge_style"] == "solid", "solid", "dash")
+        
+        # Edge midpoints (label anchors), computed for all edges at once
+        ends = soa["edge_idx"]
+        soa["edge_mid"] = 0.5 * (soa["node_xy"][ends[:, 0]] + soa["node_xy"][ends[:, 1]])
+        
+        return soa
+    
     def _validate_diagram_data(self, diagram_data: Dict[str, Any]) -> None:
         """
         Validate diagram data structure and fix issues if possible
@@ -99,7 +308,7 @@ class DiagramGenerator:
             ValueError: If diagram data is invalid and can't be fixed
         """
         # Check required keys
-        required_keys = ["nodes", "edges", "title"]
+        required_keys = ("nodes", "edges", "title")
         for key in required_keys:
             if key not in diagram_data:
                 raise ValueError(f"Missing required key in diagram data: {key}")
@@ -122,7 +331,7 @@ class DiagramGenerator:
                 raise ValueError(f"Edge at index {i} is missing 'to' field")
                 
             # Check nodes referenced by edges exist, create if missing
-            for endpoint in ["from", "to"]:
+            for endpoint in ("from", "to"):
                 node_id = edge[endpoint]
                 if node_id not in node_ids:
                     self.logger.warning(f"Creating missing node with id: {node_id}")
@@ -140,25 +349,19 @@ class DiagramGenerator:
         """
         Calculate layout positions for nodes
         
+        Layouts are memoized on the graph structure, so regenerating an
+        identical diagram reuses its positions. Callers get their own copy
+        of the position lists, so changing one leaves the memoized layout
+        intact.
+        
         Args:
             G: NetworkX graph
             
         Returns:
             Dict[str, List[float]]: Node positions {node_id: [x, y]}
         """
-        # Use hierarchical layout for flow diagrams
-        try:
-            # Try using sugiyama layout for better flow diagrams
-            pos = nx.multipartite_layout(G, subset_key="node_type")
-        except:
-            # Fall back to dot layout if sugiyama fails
-            pos = nx.nx_pydot.graphviz_layout(G, prog="dot")
-        
-        # If both fail, use a simple layout
-        if not pos:
-            pos = nx.spring_layout(G)
-        
-        return {node: pos[node].tolist() for node in G.nodes()}
+        layout = _layout_for(tuple(G.nodes(data="node_type")), tuple(G.edges()))
+        return {node: list(xy) for node, xy in layout.items()}
     
     def display(self, diagram_data: Dict[str, Any]) -> None:
         """
@@ -167,90 +370,59 @@ class DiagramGenerator:
         Args:
             diagram_data: Enriched diagram data with layout information
         """
-        G = diagram_data["graph"]
-        pos = {node: diagram_data["layout"][node] for node in G.nodes()}
+        go = _plotly()
+        soa = diagram_data["soa"]
+        node_xy = soa["node_xy"]
+        edge_ends = soa["edge_idx"]
         
         # Create figure using Plotly for interactivity
         fig = go.Figure()
         
-        # Add edges
-        for edge in G.edges():
-            from_node, to_node = edge
-            x0, y0 = pos[from_node]
-            x1, y1 = pos[to_node]
-            
-            edge_data = G.edges[edge]
-            
-            # Create edge line
+        # Add edges as one NaN-separated line trace per line style
+        for (color, width, dash), group in diagram_data["edge_groups"].items():
+            xs, ys = _segments(node_xy, edge_ends[group])
             fig.add_trace(go.Scatter(
-                x=[x0, x1],
-                y=[y0, y1],
+                x=xs,
+                y=ys,
                 mode='lines',
-                line=dict(
-                    color=edge_data.get("color", "#333"),
-                    width=edge_data.get("width", 1.5),
-                    dash='solid' if edge_data.get("style", "solid") == "solid" else 'dash'
-                ),
+                line=dict(color=color, width=width, dash=dash),
                 hoverinfo='text',
-                text=edge_data.get("label", ""),
-                name=f"Edge: {edge_data.get('label', f'{from_node} to {to_node}')}",
+                text=np.repeat(soa["edge_label"][group], 3).tolist(),
                 showlegend=False
             ))
-            
-            # Add arrow marker at midpoint
-            mid_x = (x0 + x1) / 2
-            mid_y = (y0 + y1) / 2
-            angle = np.arctan2(y1 - y0, x1 - x0) * 180 / np.pi
-            
-            # Add text label for the edge if it exists
-            if "label" in edge_data and edge_data["label"]:
-                fig.add_annotation(
-                    x=mid_x,
-                    y=mid_y,
-                    text=edge_data["label"],
-                    showarrow=False,
-                    font=dict(size=10),
-                    bgcolor="rgba(255, 255, 255, 0.8)",
-                    bordercolor="#333",
-                    borderwidth=1
-                )
         
-        # Add nodes
-        for node in G.nodes():
-            x, y = pos[node]
-            node_data = G.nodes[node]
-            node_type = node_data.get("node_type", "process")
-            color = node_data.get("color", "#4285F4")
-            
-            # Create different shapes based on node type
-            if node_type == "decision":
-                marker_symbol = "diamond"
-                marker_size = 15
-            elif node_type in ["start", "end"]:
-                marker_symbol = "circle"
-                marker_size = 12
-            else:
-                marker_symbol = "square"
-                marker_size = 14
-            
+        # Add all edge labels as a single text trace at the edge midpoints
+        labeled = np.flatnonzero(soa["edge_label"] != "")
+        if len(labeled):
+            mids = soa["edge_mid"][labeled]
             fig.add_trace(go.Scatter(
-                x=[x],
-                y=[y],
-                mode='markers+text',
-                marker=dict(
-                    symbol=marker_symbol,
-                    size=marker_size,
-                    color=color,
-                    line=dict(width=1, color='#333')
-                ),
-                text=node_data.get("label", node),
-                textposition="middle center",
-                hoverinfo='text',
-                hovertext=node_data.get("description", ""),
-                name=f"Node: {node_data.get('label', node)}",
+                x=mids[:, 0],
+                y=mids[:, 1],
+                mode='text',
+                text=soa["edge_label"][labeled].tolist(),
+                textfont=dict(size=10),
+                hoverinfo='skip',
                 showlegend=False
             ))
         
+        # Add all nodes as a single trace with per-point styling
+        fig.add_trace(go.Scatter(
+            x=node_xy[:, 0],
+            y=node_xy[:, 1],
+            mode='markers+text',
+            marker=dict(
+                symbol=soa["node_symbol"].tolist(),
+                size=soa["node_size"],
+                color=soa["node_color"].tolist(),
+                line=dict(width=1, color='#333')
+            ),
+            text=soa["node_label"].tolist(),
+            textposition="middle center",
+            hoverinfo='text',
+            hovertext=soa["node_description"].tolist(),
+            showlegend=False
+        ))
+        
         # Configure layout
         fig.update_layout(
             title=diagram_data.get("title", "Flow Diagram"),
@@ -278,68 +450,8 @@ class DiagramGenerator:
         # Create a matplotlib figure
         fig, ax = plt.subplots(figsize=(10, 8))
         
-        G = diagram_data["graph"]
-        pos = {node: diagram_data["layout"][node] for node in G.nodes()}
-        
-        # Draw edges
-        for edge in G.edges():
-            from_node, to_node = edge
-            edge_data = G.edges[edge]
-            edge_style = "-" if edge_data.get("style", "solid") == "solid" else "--"
-            
-            nx.draw_networkx_edges(
-                G, pos,
-                edgelist=[edge],
-                width=edge_data.get("width", 1.5),
-                edge_color=edge_data.get("color", "#333333"),
-                style=edge_style,
-                ax=ax
-            )
-            
-            # Add edge labels if they exist
-            if "label" in edge_data and edge_data["label"]:
-                edge_labels = {edge: edge_data["label"]}
-                nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8, ax=ax)
-        
-        # Map of node_type to matplotlib marker symbol
-        marker_map = {
-            "process": "s",     # square
-            "decision": "d",    # diamond
-            "start": "o",       # circle
-            "end": "o",         # circle
-            "io": "s",          # use square instead of parallelogram
-            "default": "s"      # square
-        }
-        
-        # Draw nodes by type
-        for node_type in set(nx.get_node_attributes(G, "node_type").values()):
-            node_list = [n for n, d in G.nodes(data=True) if d.get("node_type") == node_type]
-            
-            if node_list:
-                # Get the appropriate marker symbol
-                marker_symbol = marker_map.get(node_type, "s")
-                
-                # Get colors for nodes
-                node_color = [G.nodes[n].get("color", "#4285F4") for n in node_list]
-                
-                nx.draw_networkx_nodes(
-                    G, pos,
-                    nodelist=node_list,
-                    node_color=node_color,
-                    node_shape=marker_symbol,
-                    node_size=700,
-                    ax=ax
-                )
-        
-        # Draw node labels
-        node_labels = {n: G.nodes[n].get("label", n) for n in G.nodes()}
-        nx.draw_networkx_labels(G, pos, labels=node_labels, font_size=10, font_color="black", ax=ax)
-        
-        # Set title
-        plt.title(diagram_data.get("title", "Flow Diagram"))
-        
-        # Turn off axis
-        plt.axis("off")
+        # Draw the diagram
+        self._render_static(diagram_data, ax)
         
         # Save to bytes buffer
         buf = io.BytesIO()
@@ -362,30 +474,62 @@ class DiagramGenerator:
         # Create a matplotlib figure
         fig, ax = plt.subplots(figsize=(10, 8))
         
+        # Draw the diagram
+        self._render_static(diagram_data, ax)
+        
+        # Save to SVG string
+        buf = io.StringIO()
+        plt.savefig(buf, format="svg", bbox_inches="tight")
+        plt.close(fig)
+        buf.seek(0)
+        
+        return buf.getvalue()
+    
+    def _render_static(self, diagram_data: Dict[str, Any], ax: plt.Axes) -> None:
+        """
+        Draw the complete diagram onto a matplotlib axes, shared by the exporters
+        
+        Args:
+            diagram_data: Enriched diagram data
+            ax: Axes to draw on
+        """
         G = diagram_data["graph"]
-        pos = {node: diagram_data["layout"][node] for node in G.nodes()}
-        
-        # Draw the graph similar to export_as_png
-        # (Same drawing code as in export_as_png)
-        # Draw edges
-        for edge in G.edges():
-            from_node, to_node = edge
-            edge_data = G.edges[edge]
-            edge_style = "-" if edge_data.get("style", "solid") == "solid" else "--"
+        pos = diagram_data["pos"]
+        
+        soa = diagram_data["soa"]
+        
+        # Bucket edges by line style, reading styles from the SoA edge arrays
+        edge_buckets = {}
+        edge_labels = {}
+        edge_attrs = zip(
+            G.edges(),
+            soa["edge_color"].tolist(),
+            soa["edge_style"].tolist(),
+            soa["edge_width"].tolist(),
+            soa["edge_label"].tolist()
+        )
+        for edge, edge_color, edge_style, edge_width, edge_label in edge_attrs:
+            key = (edge_color, "-" if edge_style == "solid" else "--", edge_width)
+            edge_buckets.setdefault(key, []).append(edge)
             
+            # Collect edge labels if they exist
+            if edge_label:
+                edge_labels[edge] = edge_label
+        
+        # One draw call per (color, style, width) bucket
+        for (edge_color, edge_style, edge_width), edgelist in edge_buckets.items():
             nx.draw_networkx_edges(
                 G, pos,
-                edgelist=[edge],
-                width=edge_data.get("width", 1.5),
-                edge_color=edge_data.get("color", "#333333"),
+                edgelist=edgelist,
+                width=edge_width,
+                edge_color=edge_color,
                 style=edge_style,
                 ax=ax
             )
-            
-            # Add edge labels if they exist
-            if "label" in edge_data and edge_data["label"]:
-                edge_labels = {edge: edge_data["label"]}
-                nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8, ax=ax)
+        
+        # Add all edge labels at once
+        if edge_labels:
+            nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8, ax=ax)
         
         # Map of node_type to matplotlib marker symbol
         marker_map = {
@@ -397,16 +541,15 @@ class DiagramGenerator:
             "default": "s"      # square
         }
         
-        # Draw nodes by type
-        for node_type in set(nx.get_node_attributes(G, "node_type").values()):
-            node_list = [n for n, d in G.nodes(data=True) if d.get("node_type") == node_type]
-            
+        # Draw nodes by type, using the groups precomputed in generate()
+        node_colors_by_group = diagram_data["node_colors_by_group"]
+        for node_type, node_list in diagram_data["node_groups"].items():
             if node_list:
                 # Get the appropriate marker symbol
                 marker_symbol = marker_map.get(node_type, "s")
                 
                 # Get colors for nodes
-                node_color = [G.nodes[n].get("color", "#4285F4") for n in node_list]
+                node_color = node_colors_by_group[node_type]
                 
                 nx.draw_networkx_nodes(
                     G, pos,
@@ -418,19 +561,11 @@ class DiagramGenerator:
                 )
         
         # Draw node labels
-        node_labels = {n: G.nodes[n].get("label", n) for n in G.nodes()}
+        node_labels = dict(zip(G.nodes(), soa["node_label"].tolist()))
         nx.draw_networkx_labels(G, pos, labels=node_labels, font_size=10, font_color="black", ax=ax)
         
         # Set title
-        plt.title(diagram_data.get("title", "Flow Diagram"))
+        ax.set_title(diagram_data.get("title", "Flow Diagram"))
         
         # Turn off axis
-        plt.axis("off")
-        
-        # Save to SVG string
-        buf = io.StringIO()
-        plt.savefig(buf, format="svg", bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-        
-        return buf.getvalue()
\ No newline at end of file
+        ax.axis("off")
@@ -0,0 +1,73 @@
+"""
+Diagram Schema - Structural validation of diagram data from the model
+"""
+from typing import Any, Dict, List, Optional, Union
+from pydantic import BaseModel, Field, StrictInt
+
+# pydantic 2 renamed parse_obj and dict; support both major versions
+_PYDANTIC_V2 = hasattr(BaseModel, "model_validate")
+
+class _DiagramModel(BaseModel):
+    """Base of the diagram models; fields the schema doesn't declare are kept"""
+    if _PYDANTIC_V2:
+        model_config = {"extra": "allow"}
+    else:
+        class Config:
+            extra = "allow"
+
+class DiagramNode(_DiagramModel):
+    """A node of a flow diagram"""
+    id: Union[str, int]
+    label: Optional[str] = None
+    type: Optional[str] = None
+    description: Optional[str] = None
+
+class DiagramEdge(_DiagramModel):
+    """A directed connection between two nodes"""
+    from_: Union[str, int] = Field(alias="from")
+    to: Union[str, int]
+    label: Optional[str] = None
+    type: Optional[str] = None
+
+class DiagramAnimation(_DiagramModel):
+    """An animation step applied to a node or edge"""
+    element: Optional[str] = None
+    effect: Optional[str] = None
+    duration: Optional[float] = None
+    # Integer orders stay integers; numeric strings such as "1" become floats
+    order: Optional[Union[StrictInt, float]] = None
+
+class FlowDiagram(_DiagramModel):
+    """Structured diagram data as requested in the flow system prompt"""
+    nodes: List[DiagramNode]
+    edges: List[DiagramEdge]
+    title: str
+    description: Optional[str] = None
+    animations: List[DiagramAnimation] = []
+
+if _PYDANTIC_V2:
+    _validate = FlowDiagram.model_validate
+    _dump = FlowDiagram.model_dump
+else:
+    _validate = FlowDiagram.parse_obj
+    _dump = FlowDiagram.dict
+
+def validate_diagram(diagram_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate diagram data and coerce it to the types downstream code relies on
+    
+    Values pydantic can coerce, such as an order of "1", come back with the
+    declared type. Optional fields that were absent stay absent and unknown
+    fields are kept.
+    
+    Args:
+        diagram_data: Parsed diagram data
+        
+    Returns:
+        Dict[str, Any]: Validated diagram data
+        
+    Raises:
+        ValueError: If a required field is missing or has the wrong type
+            (pydantic's ValidationError is a ValueError)
+    """
+    return _dump(_validate(diagram_data), by_alias=True, exclude_unset=True)
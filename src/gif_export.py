@@ -2,20 +2,45 @@
 GIF export module for Flow Diagram Animation Assistant
 """
 import io
-import tempfile
 import os
-from typing import Dict, Any, List, Optional, Union
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
 import logging
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from PIL import Image, ImageDraw, ImageFont
-import networkx as nx
+from matplotlib.colors import to_rgba
+from PIL import Image
+
+try:
+    import imageio.v3 as iio
+    _HAS_IMAGEIO = True
+except ImportError:
+    # imageio is optional; without it GIFs are always written with Pillow
+    _HAS_IMAGEIO = False
+
+from src.animation import _create_default_animations, _animation_target
+from src.gif_frames import _render_frames
 
 # Get logger
 logger = logging.getLogger(__name__)
 
-def export_as_gif(diagram_data: Dict[str, Any], duration: float = 3.0, fps: int = 20) -> bytes:
+# GIF writer backend ("pillow" or "imageio") and colors in the shared frame palette
+GIF_WRITER = os.getenv("GIF_WRITER", "pillow").lower()
+GIF_PALETTE_SIZE = int(os.getenv("GIF_PALETTE_SIZE", "64"))
+
+# Distinct animation steps from which frames are rendered in the process
+# pool. A step renders in about 20 ms, so shorter animations stay serial;
+# the pool itself starts once per server process and is reused
+GIF_POOL_MIN_STEPS = int(os.getenv("GIF_POOL_MIN_STEPS", "24"))
+
+def export_as_gif(
+    diagram_data: Dict[str, Any],
+    duration: float = 3.0,
+    fps: int = 20,
+    writer: Optional[str] = None,
+    palettesize: Optional[int] = None
+) -> bytes:
     """
     Export diagram animation as GIF
     
@@ -23,6 +48,8 @@ def export_as_gif(diagram_data: Dict[str, Any], duration: float = 3.0, fps: int
         diagram_data: Enriched diagram data with layout information
         duration: Total duration of the animation in seconds
         fps: Frames per second for the GIF
+        writer: GIF writer backend, "pillow" or "imageio"; defaults to GIF_WRITER
+        palettesize: Number of colors in the frame palette; defaults to GIF_PALETTE_SIZE
         
     Returns:
         bytes: GIF image data
@@ -30,7 +57,7 @@ def export_as_gif(diagram_data: Dict[str, Any], duration: float = 3.0, fps: int
     logger.info("Exporting diagram animation as GIF")
     
     G = diagram_data["graph"]
-    pos = {node: diagram_data["layout"][node] for node in G.nodes()}
+    pos = diagram_data["pos"]
     
     # Get animation sequence
     animations = diagram_data.get("animations", [])
@@ -45,219 +72,209 @@ def export_as_gif(diagram_data: Dict[str, Any], duration: float = 3.0, fps: int
     # Calculate total frames based on duration and fps
     total_frames = int(duration * fps)
     
-    # Create a figure for the animation
-    fig, ax = plt.subplots(figsize=(10, 8))
-    
     # Initialize sets to track visibility
     visible_nodes = set()
     visible_edges = set()
     highlighted_nodes = set()
     highlighted_edges = set()
     
-    # Calculate frame mapping for animations
-    max_order = max([anim.get("order", 0) for anim in animations])
+    # Calculate frame mapping for animations; the last entry has the highest order
+    max_order = animations[-1].get("order", 0)
     frames_per_step = total_frames / max_order if max_order > 0 else total_frames
     
-    # Function to draw the current state at a given frame
-    def draw_frame(frame_num):
-        # Clear the axes for the new frame
-        ax.clear()
-        
-        # Calculate current animation step
-        current_step = int(frame_num / frames_per_step) + 1
-        
-        # Update visibility based on animations up to current step
-        for anim in animations:
-            order = anim.get("order", 0)
-            if order <= current_step:
-                element = anim.get("element", "")
-                effect = anim.get("effect", "")
-                
-                # Handle node animations
-                if element in G.nodes():
-                    if effect in ["fadeIn", "highlight", "pulse"]:
-                        visible_nodes.add(element)
-                    
-                    if effect == "highlight":
-                        highlighted_nodes.add(element)
-                
-                # Handle edge animations
-                elif element.startswith("edge_"):
-                    parts = element.split("_")[1:]
-                    if len(parts) >= 2:
-                        from_node, to_node = parts[0], parts[1]
-                        edge = (from_node, to_node)
-                        
-                        if edge in G.edges() or (to_node, from_node) in G.edges():
-                            if effect in ["draw", "fadeIn", "highlight"]:
-                                visible_edges.add(edge)
-                            
-                            if effect == "highlight":
-                                highlighted_edges.add(edge)
-        
-        # Draw edges
-        for edge in G.edges():
-            if edge not in visible_edges:
-                continue
-                
-            edge_data = G.edges[edge]
-            edge_style = "--" if edge_data.get("style", "solid") == "dashed" else "-"
-            edge_width = edge_data.get("width", 1.5)
-            
-            # Highlight edges that are in the highlighted set
-            if edge in highlighted_edges:
-                edge_color = "#FF9800"  # Orange for highlighting
-                edge_width *= 1.5
-            else:
-                edge_color = edge_data.get("color", "#333333")
-            
-            # Draw the edge
-            from_node, to_node = edge
-            nx.draw_networkx_edges(
-                G, pos,
-                edgelist=[edge],
-                width=edge_width,
-                edge_color=edge_color,
-                style=edge_style,
-                arrows=True,
-                arrowsize=15,
-                ax=ax
-            )
-            
-            # Add edge labels if they exist
-            if "label" in edge_data and edge_data["label"]:
-                label_pos = {edge: (
-                    (pos[from_node][0] + pos[to_node][0]) / 2,
-                    (pos[from_node][1] + pos[to_node][1]) / 2
-                )}
-                nx.draw_networkx_edge_labels(
-                    G, pos,
-                    edge_labels={edge: edge_data["label"]},
-                    font_size=8,
-                    bbox=dict(facecolor="white", edgecolor="none", alpha=0.7),
-                    ax=ax
-                )
+    # Animation step shown by every frame; consecutive frames share a step
+    frame_steps = [int(frame_num / frames_per_step) + 1 for frame_num in range(total_frames)]
+    steps = sorted(set(frame_steps))
+    
+    # Resolve every animation target once, checking edges against a frozen
+    # edge set, and keep (order, effect, kind, target) for those that apply
+    node_set = frozenset(G.nodes())
+    edge_set = frozenset(G.edges())
+    parsed_anims = []
+    for anim in animations:
+        kind, target = _animation_target(anim, node_set)
+        if kind is None:
+            continue
+        if kind == "edge" and target not in edge_set and target[::-1] not in edge_set:
+            continue
         
-        # Draw nodes
-        for node_type in set(nx.get_node_attributes(G, "node_type").values()):
-            # Filter nodes by type and visibility
-            node_list = [
-                n for n, d in G.nodes(data=True) 
-                if d.get("node_type") == node_type and n in visible_nodes
-            ]
-            
-            if not node_list:
-                continue
-            
-            # Get colors for each node
-            node_colors = []
-            for node in node_list:
-                if node in highlighted_nodes:
-                    node_colors.append("#FF9800")  # Orange for highlighting
-                else:
-                    node_colors.append(G.nodes[node].get("color", "#4285F4"))
+        parsed_anims.append((anim.get("order", 0), anim.get("effect", ""), kind, target))
+    
+    # Snapshot the visibility state of each distinct step; entries are in
+    # order, so each step only applies the ones its predecessor had not
+    frame_states = []
+    applied = 0
+    for current_step in steps:
+        # Update visibility with the animations up to current step
+        while applied < len(parsed_anims) and parsed_anims[applied][0] <= current_step:
+            order, effect, kind, element = parsed_anims[applied]
+            applied += 1
             
-            # Determine node shape based on type
-            if node_type == "decision":
-                node_shape = "d"  # Diamond
-            elif node_type in ["start", "end"]:
-                node_shape = "o"  # Circle
+            if kind == "node":
+                if effect in ["fadeIn", "highlight", "pulse"]:
+                    visible_nodes.add(element)
+                
+                if effect == "highlight":
+                    highlighted_nodes.add(element)
             else:
-                node_shape = "s"  # Square
-            
-            # Draw the nodes
-            nx.draw_networkx_nodes(
-                G, pos,
-                nodelist=node_list,
-                node_color=node_colors,
-                node_shape=node_shape,
-                node_size=700,
-                ax=ax
-            )
-        
-        # Draw node labels for visible nodes
-        label_nodes = {n: G.nodes[n].get("label", n) for n in visible_nodes}
-        if label_nodes:
-            nx.draw_networkx_labels(
-                G, pos,
-                labels=label_nodes,
-                font_size=10,
-                font_color="black",
-                ax=ax
-            )
-        
-        # Set title
-        ax.set_title(diagram_data.get("title", "Flow Diagram"))
-        
-        # Turn off axis
-        ax.axis("off")
+                if effect in ["draw", "fadeIn", "highlight"]:
+                    visible_edges.add(element)
+                
+                if effect == "highlight":
+                    highlighted_edges.add(element)
         
-        return ax
+        frame_states.append({
+            "visible_nodes": set(visible_nodes),
+            "visible_edges": set(visible_edges),
+            "highlighted_nodes": set(highlighted_nodes),
+            "highlighted_edges": set(highlighted_edges)
+        })
     
-    # Create animation
-    ani = animation.FuncAnimation(
-        fig, draw_frame, frames=total_frames, interval=1000/fps, blit=False
-    )
+    # Static scene shared by every frame
+    scene = {
+        "graph": G,
+        "pos": dict(pos),
+        "title": diagram_data.get("title", "Flow Diagram"),
+        "node_groups": diagram_data["node_groups"],
+        "node_idx": diagram_data["_node_idx"],
+        "soa": diagram_data["soa"]
+    }
     
-    # Save to bytes buffer
-    with tempfile.NamedTemporaryFile(suffix='.gif', delete=False) as temp_file:
-        # Save animation to temporary file
-        ani.save(
-            temp_file.name, 
-            writer='pillow', 
-            fps=fps, 
-            dpi=100
+    # Rasterize each distinct step once. Workers only need src.gif_frames
+    # (Matplotlib and NetworkX), and each renders a contiguous run of steps
+    # so it can still draw incrementally
+    workers = min(os.cpu_count() or 1, len(frame_states))
+    if workers > 1 and len(frame_states) >= GIF_POOL_MIN_STEPS:
+        chunks = [list(chunk) for chunk in np.array_split(np.arange(len(frame_states)), workers)]
+        runs = _get_frame_executor().map(
+            _render_frames,
+            [scene] * workers,
+            [[frame_states[i] for i in chunk] for chunk in chunks]
         )
-        plt.close(fig)
+        images = [image for run in runs for image in run]
+    else:
+        images = _render_frames(scene, frame_states)
+    
+    # Palettize every step against one palette sampled from all of them, so
+    # colors stay stable across frames and unchanged pixels diff away
+    palettesize = palettesize or GIF_PALETTE_SIZE
+    sample = Image.fromarray(np.concatenate([image[::4, ::4] for image in images]))
+    fixed = _diagram_colors(diagram_data["soa"])[:palettesize]
+    palette = _frame_palette(sample, fixed, palettesize)
+    step_images = {step: _quantize(image, palette, fixed) for step, image in zip(steps, images)}
+    
+    # Expand the step images back into the full frame sequence
+    frames = [step_images[step] for step in frame_steps]
+    
+    # Encode the frames as a looping GIF in memory
+    buffer = io.BytesIO()
+    writer = (writer or GIF_WRITER).lower()
+    if writer == "imageio" and _HAS_IMAGEIO:
+        rgb_steps = {step: np.asarray(image.convert("RGB")) for step, image in step_images.items()}
+        iio.imwrite(
+            buffer,
+            np.stack([rgb_steps[step] for step in frame_steps]),
+            extension=".gif",
+            duration=int(1000 / fps),
+            loop=0
+        )
+    else:
+        if writer != "pillow":
+            logger.warning(f"GIF writer '{writer}' is unavailable, using Pillow")
         
-        # Read the file back as bytes
-        with open(temp_file.name, 'rb') as f:
-            gif_data = f.read()
+        # Pillow stores each frame as the rectangle that changed since the last
+        frames[0].save(
+            buffer,
+            format="GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=int(1000 / fps),
+            loop=0,
+            optimize=False
+        )
     
-    # Clean up the temporary file
-    os.unlink(temp_file.name)
+    return buffer.getvalue()
+
+def _diagram_colors(soa: Dict[str, Any]) -> List[tuple]:
+    """
+    Get the exact colors a diagram is drawn with
     
-    return gif_data
+    Args:
+        soa: Structure-of-arrays view of the diagram
+        
+    Returns:
+        List[tuple]: Distinct RGB triples, background and text first
+    """
+    names = ["white", "black", "#FF9800", *soa["node_color"].tolist(), *soa["edge_color"].tolist()]
+    rgb = (np.asarray([to_rgba(name)[:3] for name in names]) * 255).round().astype(np.uint8)
+    return list(dict.fromkeys(map(tuple, rgb.tolist())))
 
-def _create_default_animations(diagram_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _frame_palette(sample: Image.Image, fixed: List[tuple], palettesize: int) -> Image.Image:
     """
-    Create default animations for a diagram
+    Build the shared frame palette: the diagram's own colors, so the
+    background and fills match the PNG export exactly, then the most
+    common remaining colors of the sampled frames
     
     Args:
-        diagram_data: Diagram data
+        sample: Downsampled pixels of every animation step
+        fixed: RGB colors the palette must contain, most important first
+        palettesize: Total number of palette colors
         
     Returns:
-        List[Dict[str, Any]]: List of animation instructions
+        Image.Image: Palette image for Image.quantize
     """
-    animations = []
-    G = diagram_data["graph"]
+    fixed = fixed[:palettesize]
+    colors = list(fixed)
     
-    # Get topological ordering of nodes if possible
-    try:
-        node_order = list(nx.topological_sort(G))
-    except:
-        # Fall back to original order if graph has cycles
-        node_order = list(G.nodes())
+    # Fill the remaining slots from the sample's own coverage
+    learned = sample.quantize(colors=max(palettesize - len(fixed), 1), method=Image.Quantize.MAXCOVERAGE)
+    learned_palette = learned.getpalette()
+    for i in range(0, len(learned_palette), 3):
+        if len(colors) >= palettesize:
+            break
+        color = tuple(learned_palette[i:i + 3])
+        if color not in colors:
+            colors.append(color)
     
-    # Create node appearance animations
-    for i, node in enumerate(node_order):
-        animations.append({
-            "element": node,
-            "effect": "fadeIn",
-            "duration": 0.5,
-            "order": i + 1
-        })
+    palette = Image.new("P", (1, 1))
+    palette.putpalette([channel for color in colors for channel in color])
+    return palette
+
+def _quantize(image: np.ndarray, palette: Image.Image, fixed: List[tuple]) -> Image.Image:
+    """
+    Map a frame onto the shared palette
     
-    # Create edge appearance animations
-    edge_i = 0
-    for i, node in enumerate(node_order[:-1]):
-        for successor in G.successors(node):
-            edge_i += 1
-            animations.append({
-                "element": f"edge_{node}_{successor}",
-                "effect": "draw",
-                "duration": 0.3,
-                "order": len(node_order) + edge_i
-            })
+    Pillow looks colors up at reduced precision and can map an exact
+    diagram color, even pure white, to a nearby learned one; pixels that
+    are exactly one of the fixed colors are therefore assigned it directly.
     
-    return animations
\ No newline at end of file
+    Args:
+        image: RGB pixels of the frame, shape (height, width, 3)
+        palette: Palette image from _frame_palette
+        fixed: The palette's leading colors, in palette order
+        
+    Returns:
+        Image.Image: Palettized frame
+    """
+    quantized = Image.fromarray(image).quantize(palette=palette, dither=Image.Dither.NONE)
+    indices = np.array(quantized)
+    packed = (image[..., 0].astype(np.uint32) << 16) | (image[..., 1].astype(np.uint32) << 8) | image[..., 2]
+    for index, (r, g, b) in enumerate(fixed):
+        indices[packed == (r << 16 | g << 8 | b)] = index
+    quantized.frombytes(indices.tobytes())
+    return quantized
+
+@functools.lru_cache(maxsize=1)
+def _get_frame_executor() -> ProcessPoolExecutor:
+    """
+    Get the process pool used to render GIF frames, created on the first
+    export long enough to need it
+    
+    Returns:
+        ProcessPoolExecutor: Shared frame rendering pool
+    """
+    # Spawn fresh workers; forking the threaded Streamlit server is unsafe
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
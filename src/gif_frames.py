@@ -0,0 +1,272 @@
+"""
+GIF Frames - Rendering of animation states for GIF export
+
+Only NumPy, Matplotlib and NetworkX are imported here, so GIF export
+worker processes can unpickle the render function without importing the
+app's Streamlit and Plotly modules.
+"""
+import threading
+from typing import Dict, Any, List, Union
+import numpy as np
+from matplotlib.colors import to_rgba
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import networkx as nx
+
+# Per-thread frame canvas; Streamlit sessions export from different threads
+_canvas = threading.local()
+
+def _frame_canvas() -> tuple:
+    """
+    Get the figure and axes the current thread renders every frame on
+    
+    Returns:
+        tuple: (Figure, Axes) backed by an Agg canvas
+    """
+    if not hasattr(_canvas, "fig"):
+        _canvas.fig = Figure(figsize=(10, 8), dpi=100)
+        FigureCanvasAgg(_canvas.fig)
+        _canvas.ax = _canvas.fig.add_subplot()
+    return _canvas.fig, _canvas.ax
+
+def _edge_geometry(ax, edge_xy: np.ndarray, width: Union[float, np.ndarray]) -> tuple:
+    """
+    Lay out edge lines and arrowheads the way NetworkX draws "-|>" arrows
+    
+    Ends are pulled back to the edge of NetworkX's default node marker and
+    the arrowhead is sized in points, so the geometry is computed in display
+    space for the axes' current view and mapped back to data coordinates.
+    
+    Args:
+        ax: Axes the edges are drawn on, with its final view limits
+        edge_xy: Endpoint positions of edges between distinct nodes, shape (E, 2, 2)
+        width: Line width of the edges in points, shared or one per edge
+        
+    Returns:
+        tuple: (lines, heads) in data coordinates, shapes (E, 2, 2) and (E, 3, 2)
+    """
+    # Edge endpoints in pixels
+    px = ax.figure.dpi / 72
+    ends = ax.transData.transform(edge_xy.reshape(-1, 2).astype(np.float64)).reshape(-1, 2, 2)
+    vec = ends[:, 1] - ends[:, 0]
+    length = np.hypot(vec[:, 0], vec[:, 1])
+    unit = vec / np.where(length > 0, length, 1)[:, None]
+    normal = np.stack([-unit[:, 1], unit[:, 0]], axis=1)
+    
+    # NetworkX shrinks arrows to its default 300pt^2 circle marker and draws
+    # the head 6pt long and 3pt wide to each side, with the tip pulled back
+    # so the head's outline stroke ends at the shrunk end point
+    shrink = np.sqrt(300) / 2 * px
+    pad = np.broadcast_to(0.5 * np.asarray(width) * px * np.hypot(6, 3) / 3, len(ends))[:, None]
+    tip = ends[:, 1] - unit * (shrink + pad)
+    base = tip - unit * 6 * px
+    lines = np.stack([ends[:, 0] + unit * shrink, base], axis=1)
+    heads = np.stack([tip, base + normal * 3 * px, base - normal * 3 * px], axis=1)
+    
+    # Map both back to data coordinates
+    inverse = ax.transData.inverted()
+    lines = inverse.transform(lines.reshape(-1, 2)).reshape(-1, 2, 2)
+    heads = inverse.transform(heads.reshape(-1, 2)).reshape(-1, 3, 2)
+    
+    return lines, heads
+
+def _render_frames(scene: Dict[str, Any], states: List[Dict[str, set]]) -> List[np.ndarray]:
+    """
+    Render consecutive animation states to RGB images
+    
+    Every artist of the diagram is created once, hidden, in a fixed order;
+    each state then only toggles visibility, recolors nodes and refills the
+    edge collections that changed. A state therefore renders the same
+    pixels whether it is drawn on its own or after earlier states.
+    
+    Args:
+        scene: Graph, positions, title and node groups of the diagram
+        states: Visibility and highlight sets of each frame, in step order
+        
+    Returns:
+        List[np.ndarray]: RGB pixels of each frame, shape (height, width, 3)
+    """
+    G = scene["graph"]
+    pos = scene["pos"]
+    node_idx = scene["node_idx"]
+    edges = list(G.edges())
+    
+    # Node and edge attributes from the SoA arrays, as lists for scalar access
+    soa = scene["soa"]
+    node_xy = soa["node_xy"]
+    edge_xy = node_xy[soa["edge_idx"]]
+    node_color = soa["node_color"].tolist()
+    node_label = soa["node_label"].tolist()
+    edge_color = soa["edge_color"].tolist()
+    edge_style = soa["edge_style"].tolist()
+    edge_width = soa["edge_width"].tolist()
+    edge_label = soa["edge_label"].tolist()
+    
+    # Reuse this thread's figure, clearing the previous render
+    fig, ax = _frame_canvas()
+    ax.clear()
+    ax.set_title(scene["title"])
+    ax.axis("off")
+    
+    # Frame the whole diagram up front, so frames don't re-zoom as elements
+    # appear and edge geometry laid out in display space stays valid
+    if len(G):
+        ax.update_datalim(node_xy)
+        
+        # Match the view NetworkX edge drawing gives, padding each edge's
+        # bounding box by 5% of its size
+        if len(edge_xy):
+            low, high = edge_xy.min(axis=1), edge_xy.max(axis=1)
+            ax.update_datalim(np.concatenate([low - 0.05 * (high - low), high + 0.05 * (high - low)]))
+        ax.autoscale_view()
+        
+        # Self-loops reach outside their node; let NetworkX grow the view for them
+        loops = list(nx.selfloop_edges(G))
+        if loops:
+            for artist in nx.draw_networkx_edges(G, pos, edgelist=loops, arrows=True, arrowsize=15, ax=ax):
+                artist.remove()
+    ax.set_autoscale_on(False)
+    
+    # Plain and highlighted (color, width, linestyle) of every edge
+    styles = []
+    for i in range(len(edges)):
+        style = "--" if edge_style[i] == "dashed" else "-"
+        styles.append(((edge_color[i], edge_width[i], style), ("#FF9800", edge_width[i] * 1.5, style)))
+    
+    # One line and one arrowhead collection per style, highlighted styles
+    # above plain ones; they start empty and are refilled as edges appear
+    buckets = {}
+    for key in dict.fromkeys([plain for plain, _ in styles] + [highlight for _, highlight in styles]):
+        color, width, style = key
+        buckets[key] = {
+            "members": [],
+            "lines": LineCollection([], colors=color, linewidths=width, linestyles=style, zorder=1),
+            "heads": PolyCollection(
+                [],
+                facecolors=color,
+                edgecolors=color,
+                linewidths=width,
+                joinstyle="round",
+                zorder=1
+            )
+        }
+        ax.add_collection(buckets[key]["lines"], autolim=False)
+        ax.add_collection(buckets[key]["heads"], autolim=False)
+    
+    # Line and arrowhead of every straight edge in both of its styles
+    straight = [i for i, (u, v) in enumerate(edges) if u != v]
+    geometry = {}
+    if straight:
+        for variant in (0, 1):
+            widths = np.asarray([styles[i][variant][1] for i in straight])
+            lines, heads = _edge_geometry(ax, edge_xy[straight], widths)
+            geometry.update({(i, variant): (lines[k], heads[k]) for k, i in enumerate(straight)})
+    
+    # Self-loops keep NetworkX's curved loop drawing, one artist per style
+    loop_artists = {}
+    for i, edge in enumerate(edges):
+        if edge[0] != edge[1]:
+            continue
+        for variant in (0, 1):
+            color, width, style = styles[i][variant]
+            artists = nx.draw_networkx_edges(
+                G, pos,
+                edgelist=[edge],
+                width=width,
+                edge_color=color,
+                style=style,
+                arrows=True,
+                arrowsize=15,
+                ax=ax
+            )
+            loop_artists[i, variant] = artists if isinstance(artists, list) else [artists]
+    
+    # Edge labels, shown with their edge
+    edge_texts = nx.draw_networkx_edge_labels(
+        G, pos,
+        edge_labels={edge: edge_label[i] for i, edge in enumerate(edges) if edge_label[i]},
+        font_size=8,
+        bbox=dict(facecolor="white", edgecolor="none", alpha=0.7),
+        ax=ax
+    )
+    
+    # One node collection per node type; hidden nodes are fully transparent
+    node_collections = []
+    for node_type, group in scene["node_groups"].items():
+        # Determine node shape based on type
+        if node_type == "decision":
+            node_shape = "d"  # Diamond
+        elif node_type in ["start", "end"]:
+            node_shape = "o"  # Circle
+        else:
+            node_shape = "s"  # Square
+        
+        collection = nx.draw_networkx_nodes(
+            G, pos,
+            nodelist=group,
+            node_color=[(0.0, 0.0, 0.0, 0.0)] * len(group),
+            node_shape=node_shape,
+            node_size=700,
+            ax=ax
+        )
+        colors = np.asarray([to_rgba(node_color[node_idx[node]]) for node in group])
+        node_collections.append((group, collection, colors))
+    
+    # Node labels, shown with their node
+    node_texts = nx.draw_networkx_labels(
+        G, pos,
+        labels={node: node_label[node_idx[node]] for node in G.nodes()},
+        font_size=10,
+        font_color="black",
+        ax=ax
+    )
+    for text in [*edge_texts.values(), *node_texts.values()]:
+        text.set_visible(False)
+    for artists in loop_artists.values():
+        for artist in artists:
+            artist.set_visible(False)
+    
+    highlight_rgba = np.asarray(to_rgba("#FF9800"))
+    images = []
+    for state in states:
+        visible_nodes = state["visible_nodes"]
+        visible_edges = state["visible_edges"]
+        highlighted_edges = state["highlighted_edges"]
+        
+        # Assign every visible edge to the bucket of its current style
+        members = {key: [] for key in buckets}
+        for i, edge in enumerate(edges):
+            visible = edge in visible_edges
+            variant = int(edge in highlighted_edges)
+            if edge[0] == edge[1]:
+                for loop_variant in (0, 1):
+                    for artist in loop_artists[i, loop_variant]:
+                        artist.set_visible(visible and loop_variant == variant)
+            elif visible:
+                members[styles[i][variant]].append((i, variant))
+            if edge in edge_texts:
+                edge_texts[edge].set_visible(visible)
+        
+        # Refill only the collections whose edges changed
+        for key, bucket in buckets.items():
+            if members[key] != bucket["members"]:
+                bucket["members"] = members[key]
+                bucket["lines"].set_segments([geometry[member][0] for member in members[key]])
+                bucket["heads"].set_verts([geometry[member][1] for member in members[key]])
+        
+        # Recolor nodes: transparent while hidden, orange when highlighted
+        for group, collection, colors in node_collections:
+            visible = np.fromiter((node in visible_nodes for node in group), dtype=bool, count=len(group))
+            highlighted = np.fromiter((node in state["highlighted_nodes"] for node in group), dtype=bool, count=len(group))
+            facecolors = np.where(highlighted[:, None], highlight_rgba, colors)
+            facecolors[~visible] = 0.0
+            collection.set_facecolor(facecolors)
+        for node, text in node_texts.items():
+            text.set_visible(node in visible_nodes)
+        
+        # Rasterize the figure
+        fig.canvas.draw()
+        images.append(np.asarray(fig.canvas.buffer_rgba())[..., :3].copy())
+    
+    return images
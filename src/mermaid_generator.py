@@ -1,8 +1,47 @@
 """
 Mermaid Diagram Generator - Module for generating Mermaid diagrams
 """
+import functools
 import streamlit as st
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+# Node declaration and style templates by node type
+NODE_TEMPLATES = {
+    "start": ('    {id}(["{label}"])', '    style {id} fill:#34A853,stroke:#333,color:white'),
+    "end": ('    {id}(["{label}"])', '    style {id} fill:#EA4335,stroke:#333,color:white'),
+    "decision": ('    {id}{{"{label}"}}', '    style {id} fill:#FBBC05,stroke:#333,color:black'),
+    "io": ('    {id}[/"{label}"/]', '    style {id} fill:#9C27B0,stroke:#333,color:white'),
+    "process": ('    {id}["{label}"]', '    style {id} fill:#4285F4,stroke:#333,color:white')
+}
+
+# Edge link (unlabeled, labeled) and linkStyle templates by edge type
+EDGE_TEMPLATES = {
+    "conditional": (
+        "    {source} -- >{target}",
+        "    {source} -- {label} -- >{target}",
+        "    linkStyle {index} stroke:#FF9800,stroke-width:2px,stroke-dasharray: 5 5"
+    ),
+    "feedback": (
+        "    {source} -.- >{target}",
+        "    {source} -.- {label} -.- >{target}",
+        "    linkStyle {index} stroke:#9C27B0,stroke-width:2px"
+    ),
+    "normal": (
+        "    {source} --- >{target}",
+        "    {source} --- {label} --- >{target}",
+        None
+    )
+}
+
+# Bound format methods of the templates, resolved once at import
+_NODE_RENDERERS = {
+    node_type: (shape.format, style.format)
+    for node_type, (shape, style) in NODE_TEMPLATES.items()
+}
+_EDGE_RENDERERS = {
+    edge_type: (link.format, labeled_link.format, link_style.format if link_style else None)
+    for edge_type, (link, labeled_link, link_style) in EDGE_TEMPLATES.items()
+}
 
 def generate_mermaid(diagram_data: Dict[str, Any]) -> str:
     """
@@ -14,71 +53,62 @@ def generate_mermaid(diagram_data: Dict[str, Any]) -> str:
     Returns:
         str: Mermaid diagram code
     """
-    # Start with flowchart definition
-    mermaid_code = ["flowchart TD"]
+    # Freeze only the fields the Mermaid code depends on, so derived fields
+    # of enriched data (layout, graph, ...) don't affect caching
+    title = diagram_data.get("title", "Flow Diagram")
+    nodes = tuple(
+        (node.get("id", ""), node.get("label", node.get("id", "")), node.get("type", "process"))
+        for node in diagram_data.get("nodes", [])
+    )
+    edges = tuple(
+        (edge.get("from", ""), edge.get("to", ""), edge.get("label", ""), edge.get("type", "normal"))
+        for edge in diagram_data.get("edges", [])
+    )
+    
+    try:
+        return _generate_mermaid_cached(title, nodes, edges)
+    except TypeError:
+        # Unhashable field values can't be cached; render them directly
+        return _generate_mermaid_cached.__wrapped__(title, nodes, edges)
+
+@functools.lru_cache(maxsize=32)
+def _generate_mermaid_cached(title: Any, nodes: Tuple[tuple, ...], edges: Tuple[tuple, ...]) -> str:
+    """
+    Generate Mermaid diagram code, memoized per diagram content
     
-    # Track processed nodes for styling
-    node_ids = []
+    Args:
+        title: Diagram title
+        nodes: (id, label, type) of each node
+        edges: (from, to, label, type) of each edge
+        
+    Returns:
+        str: Mermaid diagram code
+    """
+    # Start with flowchart definition and the title as a comment
+    mermaid_code = ["flowchart TD", f"    %% {title}"]
     
-    # Add nodes with styling
-    for node in diagram_data.get("nodes", []):
-        node_id = node.get("id", "")
+    # Add nodes with styling based on type
+    for node_id, node_label, node_type in nodes:
         if not node_id:
             continue
             
-        node_ids.append(node_id)
-        node_label = node.get("label", node_id)
-        node_type = node.get("type", "process")
-        
-        # Determine node styling based on type
-        if node_type == "start":
-            mermaid_code.append(f'    {node_id}(["{node_label}"])')
-            mermaid_code.append(f'    style {node_id} fill:#34A853,stroke:#333,color:white')
-        elif node_type == "end":
-            mermaid_code.append(f'    {node_id}(["{node_label}"])')
-            mermaid_code.append(f'    style {node_id} fill:#EA4335,stroke:#333,color:white')
-        elif node_type == "decision":
-            mermaid_code.append(f'    {node_id}{{{"{node_label}"}}}')
-            mermaid_code.append(f'    style {node_id} fill:#FBBC05,stroke:#333,color:black')
-        elif node_type == "io":
-            mermaid_code.append(f'    {node_id}[/"{node_label}"/]')
-            mermaid_code.append(f'    style {node_id} fill:#9C27B0,stroke:#333,color:white')
-        else:  # process or default
-            mermaid_code.append(f'    {node_id}["{node_label}"]')
-            mermaid_code.append(f'    style {node_id} fill:#4285F4,stroke:#333,color:white')
+        shape, style = _NODE_RENDERERS.get(node_type, _NODE_RENDERERS["process"])
+        mermaid_code.append(shape(id=node_id, label=node_label))
+        mermaid_code.append(style(id=node_id))
     
-    # Add edges
-    for edge in diagram_data.get("edges", []):
-        from_node = edge.get("from", "")
-        to_node = edge.get("to", "")
+    # Add edges with styling based on type; linkStyle indexes count links
+    # in the order they are defined
+    edge_idx = 0
+    for from_node, to_node, edge_label, edge_type in edges:
         if not from_node or not to_node:
             continue
             
-        edge_label = edge.get("label", "")
-        edge_type = edge.get("type", "normal")
-        
-        # Determine edge styling based on type
-        if edge_type == "conditional":
-            link_style = " -- "
-            if edge_label:
-                link_style = f" -- {edge_label} -- "
-            mermaid_code.append(f'    {from_node}{link_style}>{to_node}')
-            mermaid_code.append(f'    linkStyle {len(mermaid_code) - 2 - len(node_ids)} stroke:#FF9800,stroke-width:2px,stroke-dasharray: 5 5')
-        elif edge_type == "feedback":
-            link_style = " -.- "
-            if edge_label:
-                link_style = f" -.- {edge_label} -.- "
-            mermaid_code.append(f'    {from_node}{link_style}>{to_node}')
-            mermaid_code.append(f'    linkStyle {len(mermaid_code) - 2 - len(node_ids)} stroke:#9C27B0,stroke-width:2px')
-        else:  # normal or default
-            link_style = " --- "
-            if edge_label:
-                link_style = f" --- {edge_label} --- "
-            mermaid_code.append(f'    {from_node}{link_style}>{to_node}')
-    
-    # Add title as a comment
-    title = diagram_data.get("title", "Flow Diagram")
-    mermaid_code.insert(1, f"    %% {title}")
+        link, labeled_link, link_style = _EDGE_RENDERERS.get(edge_type, _EDGE_RENDERERS["normal"])
+        link = labeled_link if edge_label else link
+        mermaid_code.append(link(source=from_node, target=to_node, label=edge_label))
+        if link_style:
+            mermaid_code.append(link_style(index=edge_idx))
+        edge_idx += 1
     
     return "\n".join(mermaid_code)
 
@@ -1,15 +1,201 @@
 """
 Ollama Client - Module for interacting with Ollama API
 """
+import os
+import re
 import json
+import time
+import asyncio
+import functools
 import requests
-from typing import Dict, Any, Optional, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Final, Iterator, Optional, List, Tuple
 import logging
-import sys
+from src.prompt_cache import PromptCache
+from src.diagram_schema import validate_diagram
+from src.utils.logger import setup_logger
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    # orjson is optional; JSON is then encoded and decoded with the stdlib
+    _HAS_ORJSON = False
+
+# Both decoders accept str or bytes, and orjson's JSONDecodeError
+# subclasses json.JSONDecodeError, so callers catch the stdlib error
+if _HAS_ORJSON:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:
+    _loads = json.loads
+    
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+@functools.lru_cache(maxsize=16)
+def _json_bytes(value: str) -> bytes:
+    """
+    Encode a string as a JSON value, memoized for repeated payload fields
+    
+    Args:
+        value: String to encode
+        
+    Returns:
+        bytes: JSON encoding of the string
+    """
+    return _dumps(value)
+
+# Characters that change the brace-matching state of a JSON scan
+_JSON_TOKEN = re.compile(r'[{}"\\]')
+
+def _balanced_json_objects(text: str) -> Iterator[str]:
+    """
+    Find the top-level {...} spans in text
+    
+    Braces inside double-quoted strings (honouring backslash escapes) don't
+    count, so labels containing braces don't cut an object short.
+    
+    Args:
+        text: Text that may contain JSON objects
+        
+    Yields:
+        str: Each balanced top-level object, in order
+    """
+    offset = 0
+    while True:
+        depth = 0
+        start = 0
+        in_string = False
+        escaped = -1
+        
+        # Only braces, quotes and backslashes matter, so jump between them
+        for match in _JSON_TOKEN.finditer(text, offset):
+            pos = match.start()
+            if pos == escaped:
+                continue
+            char = text[pos]
+            
+            if in_string:
+                if char == "\\":
+                    escaped = pos + 1
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                # Quotes in prose outside an object are ignored
+                in_string = depth > 0
+            elif char == "{":
+                if depth == 0:
+                    start = pos
+                depth += 1
+            elif char == "}" and depth:
+                depth -= 1
+                if depth == 0:
+                    yield text[start:pos + 1]
+        
+        # An unclosed object may have started at a stray brace in prose,
+        # so rescan from just after it
+        if not depth:
+            return
+        offset = start + 1
+
+# System prompt for flow diagram requests
+_FLOW_SYSTEM_PROMPT: Final[str] = """
+You are a specialized flow diagram creation assistant. Your task is to convert
+user descriptions into structured JSON that represents flow diagrams.
+
+Output a valid JSON object with the following structure:
+{
+    "nodes": [
+        {"id": "node1", "label": "Node Label", "type": "process|decision|start|end|io", "description": "Optional description"},
+        ...
+    ],
+    "edges": [
+        {"from": "node1", "to": "node2", "label": "Connection Label", "type": "normal|conditional|feedback"},
+        ...
+    ],
+    "title": "Diagram Title",
+    "description": "Overall diagram description",
+    "animations": [
+        {"element": "node1", "effect": "fadeIn|highlight|pulse", "duration": 1.0, "order": 1},
+        {"element": "edge_node1_node2", "effect": "draw|highlight", "duration": 0.8, "order": 2},
+        ...
+    ]
+}
+
+Ensure all IDs are unique and all references are valid. Include meaningful animations
+that help illustrate the flow sequence.
+"""
+
+# User prompt for system design requests
+_SYSTEM_DESIGN_PROMPT: Final[str] = """
+Create a comprehensive system design diagram with the following components at minimum:
+- User/Client (start node)
+- Frontend/UI layer
+- Backend/API layer
+- Database/Storage (io node)
+- Any additional components needed
+
+Make sure each node has a clear purpose and all connections between components are logical.
+Ensure all node IDs referenced in edges exist in the nodes array.
+
+Respond only with the JSON structure.
+"""
+
+# Static start of the user prompt for flow requests; the description follows
+_FLOW_PROMPT_PREFIX: Final[str] = """
+Respond only with the JSON structure defined in the system prompt.
+Create a detailed flow diagram from the following description:
+
+"""
+
+# Fixed start and end nodes of fallback diagrams; copied into each diagram
+_FALLBACK_START_NODE: Final[Dict[str, str]] = {
+    "id": "start",
+    "label": "Start",
+    "type": "start",
+    "description": "Beginning of the process"
+}
+_FALLBACK_END_NODE: Final[Dict[str, str]] = {
+    "id": "end",
+    "label": "End",
+    "type": "end",
+    "description": "End of the process"
+}
+
+# Seconds to wait for a connection and between response bytes; generation
+# can pause for a while on a cold model, so the read timeout is generous
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+
+# Maximum concurrent generate requests from generate_many; matches
+# Ollama's default OLLAMA_NUM_PARALLEL
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+
+# Keep-alive connections kept for reuse. One client is shared by every
+# Streamlit session, each sending requests from its own thread, so the pool
+# is sized for concurrent requests across sessions rather than for one
+# generate_many call; sockets are only opened on demand
+OLLAMA_POOL_MAXSIZE = int(os.getenv("OLLAMA_POOL_MAXSIZE", "32"))
+
+# Seconds a successful connection check (and its resolved model) is reused
+VERIFY_CACHE_TTL = float(os.getenv("OLLAMA_VERIFY_CACHE_TTL", "30"))
+
+# Seconds a cached model response stays valid
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "3600"))
+
+# Embedding model for the semantic prompt cache; unset disables that tier
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "")
+PROMPT_CACHE_SIMILARITY = float(os.getenv("PROMPT_CACHE_SIMILARITY", "0.92"))
 
 class OllamaClient:
     """Client for interacting with Ollama API running in Docker"""
     
+    # (base_url, requested model) -> (check time, resolved model) of recent
+    # successful connection checks, shared by every client
+    _verification_cache: Dict[Tuple[str, str], Tuple[float, str]] = {}
+    
     def __init__(self, base_url: str, model_name: str):
         """
         Initialize the Ollama client
@@ -20,175 +206,399 @@ class OllamaClient:
         """
         self.base_url = base_url.rstrip('/')
         self.model_name = model_name
-        self.logger = logging.getLogger(__name__)
+        self.requested_model = model_name
+        self.logger = setup_logger(__name__)
         self.generate_endpoint = f"{self.base_url}/api/generate"
+        self.embeddings_endpoint = f"{self.base_url}/api/embeddings"
+        
+        # Reuse one HTTP session (and its connections) for every request;
+        # the client only talks to one host, and the pool keeps the sockets
+        # of up to OLLAMA_POOL_MAXSIZE concurrent requests for reuse.
+        # Connection failures and gateway errors are retried with a short
+        # backoff
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/json"
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=OLLAMA_POOL_MAXSIZE,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.timeout = (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+        
+        # Responses are cached per model, system prompt and prompt; with an
+        # embedding model configured, paraphrased prompts hit the cache too
+        self.cache = PromptCache(
+            ttl=PROMPT_CACHE_TTL,
+            embed=self._embed if OLLAMA_EMBED_MODEL else None,
+            similarity_threshold=PROMPT_CACHE_SIMILARITY
+        )
         
-        # Set up console logging for debugging
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
+        self.logger.debug("Endpoint: %s", self.generate_endpoint)
         
         # Verify connection
         self._verify_connection()
     
+    def close(self) -> None:
+        """Close the HTTP session and its pooled connections"""
+        self._session.close()
+    
+    def __enter__(self) -> "OllamaClient":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
     def _verify_connection(self) -> bool:
         """
-        Verify connection to Ollama API
+        Verify connection to Ollama API and resolve the client's default model
         
         Returns:
             bool: True if connection is successful, False otherwise
         """
+        connected, self.model_name = self._resolve_model(self.model_name)
+        return connected
+    
+    def _resolve_model(self, model_name: str) -> Tuple[bool, str]:
+        """
+        Check the connection and find the available model to use for a name
+        
+        Args:
+            model_name: Requested model name
+            
+        Returns:
+            Tuple[bool, str]: Whether the connection succeeded, and the model
+                to use: the requested one, its ':latest' tag, or the first
+                available model
+        """
+        # Reuse a recent successful check instead of calling /api/tags again
+        cache_key = (self.base_url, model_name)
+        cached = self._verification_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < VERIFY_CACHE_TTL:
+            return True, cached[1]
+        
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=self.timeout)
             if response.status_code == 200:
-                models = response.json().get("models", [])
+                models = _loads(response.content).get("models", [])
                 model_names = [m.get("name") for m in models]
-                self.logger.info(f"Successfully connected to Ollama API at {self.base_url}")
-                self.logger.info(f"Available models: {model_names}")
+                self.logger.info("Successfully connected to Ollama API at %s", self.base_url)
+                self.logger.info("Available models: %s", model_names)
                 
                 # Check if our model exists
-                if not any(self.model_name in name for name in model_names):
-                    self.logger.warning(f"Model '{self.model_name}' not found in available models. Will attempt to use '{self.model_name}:latest' or first available model.")
+                resolved = model_name
+                if not any(model_name in name for name in model_names):
+                    self.logger.warning("Model '%s' not found in available models. Will attempt to use '%s:latest' or first available model.", model_name, model_name)
                     # If our specific model isn't available, try with :latest or use the first available model
                     if model_names:
-                        if f"{self.model_name}:latest" in model_names:
-                            self.model_name = f"{self.model_name}:latest"
+                        if f"{model_name}:latest" in model_names:
+                            resolved = f"{model_name}:latest"
                         else:
-                            self.model_name = model_names[0].split(':')[0]  # Use base name of first model
-                        self.logger.info(f"Using model: {self.model_name}")
+                            resolved = model_names[0].split(':')[0]  # Use base name of first model
+                        self.logger.info("Using model: %s", resolved)
                 
-                return True
+                self._verification_cache[cache_key] = (time.monotonic(), resolved)
+                return True, resolved
             else:
-                self.logger.warning(f"Connection to Ollama API failed with status code {response.status_code}")
-                return False
+                self.logger.warning("Connection to Ollama API failed with status code %s", response.status_code)
+                return False, model_name
         except Exception as e:
-            self.logger.error(f"Failed to connect to Ollama API: {e}")
-            return False
+            self.logger.error("Failed to connect to Ollama API: %s", e)
+            return False, model_name
+    
+    def _model_for(self, model: Optional[str]) -> str:
+        """
+        Get the model to send for a request
+        
+        Args:
+            model: Requested model name, or None for the client's default
+            
+        Returns:
+            str: Resolved model name
+        """
+        if model is None or model == self.requested_model:
+            return self.model_name
+        return self._resolve_model(model)[1]
+    
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed text with the configured embedding model
+        
+        Args:
+            text: Text to embed
+            
+        Returns:
+            Optional[List[float]]: Embedding vector, or None if the request fails
+        """
+        try:
+            response = self._session.post(
+                self.embeddings_endpoint,
+                data=_dumps({"model": OLLAMA_EMBED_MODEL, "prompt": text}),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return _loads(response.content).get("embedding")
+        except (requests.RequestException, ValueError) as e:
+            self.logger.warning("Failed to embed prompt for caching: %s", e)
+            return None
     
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def set_model(self, model_name: str) -> None:
+        """
+        Switch the client's default model, keeping the HTTP session
+        
+        Clients shared between threads or Streamlit sessions should pass
+        model= per call instead, so concurrent requests don't race.
+        
+        Args:
+            model_name: Name of the model to use (e.g., llama3, mistral)
+        """
+        if model_name == self.requested_model:
+            return
+        
+        self.model_name = model_name
+        self.requested_model = model_name
+        self._verify_connection()
+    
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, model: Optional[str] = None) -> str:
         """
         Generate text using the Ollama model
         
         Args:
             prompt: The user prompt
             system_prompt: Optional system prompt for context
+            model: Model to use for this call; defaults to the client's model
             
         Returns:
             str: Generated text response
         """
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False,
-        }
+        return "".join(self.generate_stream(prompt, system_prompt, model))
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Generate text using the Ollama model, yielding tokens as they arrive
         
-        if system_prompt:
-            payload["system"] = system_prompt
+        The generator can be passed to st.write_stream; the full response
+        is cached once the stream completes.
         
-        self.logger.info(f"Sending request to Ollama API with model {self.model_name}")
-        self.logger.info(f"Endpoint: {self.generate_endpoint}")
-        self.logger.info(f"Payload: {json.dumps(payload)}")
+        Args:
+            prompt: The user prompt
+            system_prompt: Optional system prompt for context
+            model: Model to use for this call; defaults to the client's model
+            
+        Yields:
+            str: Chunks of the generated text response
+        """
+        model_name = self._model_for(model)
+        
+        # Serve repeated (or, with embeddings, similar) prompts from the cache
+        cache_key = PromptCache.key(model_name, system_prompt, prompt)
+        cache_scope = PromptCache.scope(model_name, system_prompt)
+        cached = self.cache.get(cache_key, cache_scope, prompt)
+        if cached is not None:
+            self.logger.info("Prompt cache hit for model %s", model_name)
+            yield cached
+            return
+        
+        # Splice the payload from encoded fields; the model name and system
+        # prompt rarely change, so their encodings are memoized
+        body = b'{"model":%s,"prompt":%s,"stream":true%s}' % (
+            _json_bytes(model_name),
+            _dumps(prompt),
+            b',"system":' + _json_bytes(system_prompt) if system_prompt else b""
+        )
+        
+        # Log arguments are formatted lazily; the full payload is only
+        # decoded and logged when debugging
+        self.logger.info("Sending request to Ollama API with model %s", model_name)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Payload: %s", body.decode())
         
+        parts = []
+        done = False
         try:
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(self.generate_endpoint, json=payload, headers=headers)
-            
-            self.logger.info(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                self.logger.error(f"Error response: {response.text}")
-                response.raise_for_status()
+            # The context manager returns the connection to the pool even
+            # if the consumer stops iterating early
+            with self._session.post(self.generate_endpoint, data=body, stream=True, timeout=self.timeout) as response:
+                self.logger.info("Response status code: %s", response.status_code)
+                if response.status_code != 200:
+                    self.logger.error("Error response: %s", response.text)
+                    response.raise_for_status()
                 
-            result = response.json()
-            self.logger.info("Response received successfully")
-            
-            return result.get("response", "")
+                # Ollama streams one JSON object per line, ending with "done"
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = _loads(line)
+                    except ValueError as e:
+                        self.logger.error("Malformed response chunk from Ollama: %s", e)
+                        raise RuntimeError(f"Failed to generate text with Ollama: malformed response chunk: {e}")
+                    if "error" in chunk:
+                        raise RuntimeError(f"Failed to generate text with Ollama: {chunk['error']}")
+                    
+                    token = chunk.get("response", "")
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        done = True
+                        break
         except requests.RequestException as e:
-            self.logger.error(f"Error during API call to Ollama: {e}")
+            self.logger.error("Error during API call to Ollama: %s", e)
             raise RuntimeError(f"Failed to generate text with Ollama: {e}")
+        
+        # Only a stream Ollama marked as done is a complete response worth caching
+        if not done:
+            self.logger.warning("Ollama response stream ended before completion; not caching it")
+            return
+        
+        self.logger.info("Response received successfully")
+        self.cache.put(cache_key, "".join(parts), cache_scope, prompt)
     
-    def generate_flow_description(self, description: str) -> Dict[str, Any]:
+    def generate_flow_description(self, description: str, model: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate a flow diagram description from a text prompt
         
         Args:
             description: User description of the desired flow diagram
+            model: Model to use for this call; defaults to the client's model
             
         Returns:
             Dict[str, Any]: Structured data for flow diagram generation
         """
-        if "system design" in description.lower() or "system architecture" in description.lower():
-            prompt = f"""
-            Create a comprehensive system design diagram with the following components at minimum:
-            - User/Client (start node)
-            - Frontend/UI layer
-            - Backend/API layer
-            - Database/Storage (io node)
-            - Any additional components needed
-            
-            Make sure each node has a clear purpose and all connections between components are logical.
-            Ensure all node IDs referenced in edges exist in the nodes array.
-            
-            Respond only with the JSON structure.
-            """
-        else:
-            system_prompt = """
-            You are a specialized flow diagram creation assistant. Your task is to convert
-            user descriptions into structured JSON that represents flow diagrams.
+        prompt, system_prompt = self._build_flow_prompt(description)
+        response = self.generate(prompt, system_prompt, model)
+        cache_key = PromptCache.key(self._model_for(model), system_prompt, prompt)
+        return self._parse_flow_response(description, response, cache_key)
+    
+    async def agenerate(self, prompt: str, system_prompt: Optional[str] = None, model: Optional[str] = None) -> str:
+        """
+        Generate text using the Ollama model without blocking the event loop
+        
+        The blocking HTTP call runs in the default thread pool, so several
+        awaits can be in flight at once; Ollama serves them concurrently up
+        to its OLLAMA_NUM_PARALLEL setting.
+        
+        Args:
+            prompt: The user prompt
+            system_prompt: Optional system prompt for context
+            model: Model to use for this call; defaults to the client's model
             
-            Output a valid JSON object with the following structure:
-            {
-                "nodes": [
-                    {"id": "node1", "label": "Node Label", "type": "process|decision|start|end|io", "description": "Optional description"},
-                    ...
-                ],
-                "edges": [
-                    {"from": "node1", "to": "node2", "label": "Connection Label", "type": "normal|conditional|feedback"},
-                    ...
-                ],
-                "title": "Diagram Title",
-                "description": "Overall diagram description",
-                "animations": [
-                    {"element": "node1", "effect": "fadeIn|highlight|pulse", "duration": 1.0, "order": 1},
-                    {"element": "edge_node1_node2", "effect": "draw|highlight", "duration": 0.8, "order": 2},
-                    ...
-                ]
-            }
+        Returns:
+            str: Generated text response
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate, prompt, system_prompt, model)
+    
+    async def agenerate_flow_description(self, description: str, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async variant of generate_flow_description
+        
+        Args:
+            description: User description of the desired flow diagram
+            model: Model to use for this call; defaults to the client's model
             
-            Ensure all IDs are unique and all references are valid. Include meaningful animations
-            that help illustrate the flow sequence.
-            """
+        Returns:
+            Dict[str, Any]: Structured data for flow diagram generation
+        """
+        prompt, system_prompt = self._build_flow_prompt(description)
+        response = await self.agenerate(prompt, system_prompt, model)
+        cache_key = PromptCache.key(self._model_for(model), system_prompt, prompt)
+        return self._parse_flow_response(description, response, cache_key)
+    
+    async def generate_many(self, descriptions: List[str], model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Generate several flow diagram descriptions concurrently
+        
+        At most OLLAMA_MAX_CONCURRENCY requests are in flight at once; more
+        would only queue inside Ollama and count against the read timeout.
+        
+        Args:
+            descriptions: User descriptions of the desired flow diagrams
+            model: Model to use for these calls; defaults to the client's model
             
-            prompt = f"""
-            Create a detailed flow diagram from the following description:
+        Returns:
+            List[Dict[str, Any]]: Structured data for each description, in order
+        """
+        semaphore = asyncio.Semaphore(OLLAMA_MAX_CONCURRENCY)
+        
+        async def run_one(description: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.agenerate_flow_description(description, model)
+        
+        return list(await asyncio.gather(*[run_one(d) for d in descriptions]))
+    
+    def generate_flow_descriptions(self, descriptions: List[str], model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Generate several flow diagram descriptions concurrently
+        
+        Args:
+            descriptions: User descriptions of the desired flow diagrams
+            model: Model to use for these calls; defaults to the client's model
             
-            {description}
+        Returns:
+            List[Dict[str, Any]]: Structured data for each description, in order
+        """
+        return asyncio.run(self.generate_many(descriptions, model))
+    
+    def _build_flow_prompt(self, description: str) -> Tuple[str, str]:
+        """
+        Build the prompt and system prompt for a flow diagram request
+        
+        Args:
+            description: User description of the desired flow diagram
             
-            Respond only with the JSON structure defined in the system prompt.
-            """
+        Returns:
+            Tuple[str, str]: Prompt and system prompt
+        """
+        lowered = description.lower()
+        if "system design" in lowered or "system architecture" in lowered:
+            prompt = _SYSTEM_DESIGN_PROMPT
+        else:
+            # The static instructions come first and the description last, so
+            # Ollama's prompt cache can reuse the shared prefix across requests
+            prompt = _FLOW_PROMPT_PREFIX + description
         
-        response = self.generate(prompt, system_prompt)
+        return prompt, _FLOW_SYSTEM_PROMPT
+    
+    def _parse_flow_response(self, description: str, response: str, cache_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Turn a raw model response into structured diagram data
         
+        Args:
+            description: User description of the desired flow diagram
+            response: Raw response from Ollama
+            cache_key: Prompt cache key the response is stored under; a
+                response that falls back is dropped, so a retry asks again
+            
+        Returns:
+            Dict[str, Any]: Structured data for flow diagram generation
+        """
         # Log the full response for debugging
-        self.logger.info(f"Full response: {response}")
+        self.logger.debug("Full response: %s", response)
         
         # Extract JSON using the improved method
         diagram_data = self._extract_json_content(response)
         
         if diagram_data:
-            # Validate the basic structure
-            required_keys = ["nodes", "edges", "title"]
-            if all(key in diagram_data for key in required_keys):
-                return diagram_data
-            else:
-                missing = [key for key in required_keys if key not in diagram_data]
-                self.logger.error(f"Missing required keys in diagram data: {missing}")
+            # Validate the structure of nodes, edges and animations
+            try:
+                return validate_diagram(diagram_data)
+            except ValueError as e:
+                self.logger.error("Invalid diagram data: %s", e)
         else:
             self.logger.error("Could not extract valid JSON from response")
         
         # If we couldn't parse JSON or it's invalid, create a fallback structure
         self.logger.warning("Creating fallback diagram structure")
+        if cache_key is not None:
+            self.cache.discard(cache_key)
         return self._create_fallback_diagram(description, response)
     
     def _create_fallback_diagram(self, description: str, response: str) -> Dict[str, Any]:
@@ -202,31 +612,26 @@ class OllamaClient:
         Returns:
             Dict[str, Any]: Basic diagram structure
         """
-        # Extract possible nodes from the response text
-        lines = response.split('\n')
-        potential_nodes = []
-        for line in lines:
+        # Extract distinct possible nodes from the response text in one pass,
+        # stopping once there are as many as the diagram uses
+        seen = {}
+        for line in response.splitlines():
             line = line.strip()
-            if line and len(line) > 3 and not line.startswith('{') and not line.startswith('}'):
-                potential_nodes.append(line.split(':')[0] if ':' in line else line)
-        
-        # Limit to a reasonable number of distinct nodes
-        potential_nodes = list(set([node.strip() for node in potential_nodes]))[:10]
+            if len(line) > 3 and line[0] not in '{}':
+                key = line.split(':', 1)[0] if ':' in line else line
+                seen.setdefault(key.strip(), None)
+                if len(seen) >= 5:
+                    break
+        potential_nodes = list(seen)
         
         # Create a simple linear flow
         nodes = []
-        edges = []
         
         # Start node
-        nodes.append({
-            "id": "start",
-            "label": "Start",
-            "type": "start",
-            "description": "Beginning of the process"
-        })
+        nodes.append(dict(_FALLBACK_START_NODE))
         
         # Add nodes from potential_nodes or create generic ones
-        for i, node_text in enumerate(potential_nodes[:5] if potential_nodes else range(3)):
+        for i, node_text in enumerate(potential_nodes or range(3)):
             node_id = f"node{i+1}"
             if isinstance(node_text, str):
                 node_label = node_text[:30]  # Truncate long labels
@@ -241,57 +646,37 @@ class OllamaClient:
             })
         
         # End node
-        nodes.append({
-            "id": "end",
-            "label": "End",
-            "type": "end",
-            "description": "End of the process"
-        })
-        
-        # Create edges to connect all nodes sequentially
-        prev_id = "start"
-        for i in range(len(nodes) - 2):  # Exclude start and end nodes
-            current_id = f"node{i+1}"
-            edges.append({
-                "from": prev_id,
-                "to": current_id,
-                "label": f"Step {i+1}",
+        nodes.append(dict(_FALLBACK_END_NODE))
+        
+        # Connect all nodes sequentially, the last one to the end node
+        ids = [node["id"] for node in nodes]
+        edges = [
+            {
+                "from": from_id,
+                "to": to_id,
+                "label": f"Step {i}" if to_id != "end" else "Complete",
                 "type": "normal"
-            })
-            prev_id = current_id
-        
-        # Connect last node to end
-        edges.append({
-            "from": prev_id,
-            "to": "end",
-            "label": "Complete",
-            "type": "normal"
-        })
-        
-        # Create simple animations
-        animations = []
-        for i, node in enumerate(nodes):
-            animations.append({
-                "element": node["id"],
-                "effect": "fadeIn",
-                "duration": 0.8,
-                "order": i+1
-            })
+            }
+            for i, (from_id, to_id) in enumerate(zip(ids[:-1], ids[1:]), start=1)
+        ]
         
-        for i, edge in enumerate(edges):
-            animations.append({
-                "element": f"edge_{edge['from']}_{edge['to']}",
-                "effect": "draw",
-                "duration": 0.5,
-                "order": len(nodes) + i+1
-            })
+        # Create simple animations: nodes fade in, then edges are drawn
+        animations = [
+            {"element": node_id, "effect": "fadeIn", "duration": 0.8, "order": i}
+            for i, node_id in enumerate(ids, start=1)
+        ] + [
+            {"element": f"edge_{edge['from']}_{edge['to']}", "effect": "draw", "duration": 0.5, "order": len(nodes) + i}
+            for i, edge in enumerate(edges, start=1)
+        ]
         
         return {
             "nodes": nodes,
             "edges": edges,
             "title": "Flow Diagram",
-            "description": description[:100] + "...",
-            "animations": animations
+            "description": description[:97] + "..." if len(description) > 100 else description,
+            "animations": animations,
+            # Lets callers tell a fallback from a parsed diagram, e.g. to not cache it
+            "_fallback": True
         }
     
     def _extract_json_content(self, text: str) -> Optional[Dict[str, Any]]:
@@ -304,16 +689,11 @@ class OllamaClient:
         Returns:
             dict: Parsed JSON object or None if parsing fails
         """
-        import re
-        
-        # Try to find JSON using regex pattern
-        json_pattern = r'(\{[\s\S]*\})'
-        matches = re.findall(json_pattern, text)
-        
-        for potential_json in matches:
+        # Try each balanced top-level object in the text
+        for potential_json in _balanced_json_objects(text):
             try:
                 # Try to parse the potential JSON
-                result = json.loads(potential_json)
+                result = _loads(potential_json)
                 # If it parsed successfully and is a dict, return it
                 if isinstance(result, dict):
                     return result
@@ -328,7 +708,7 @@ class OllamaClient:
                     fixed_json = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', fixed_json)
                     
                     # Try to parse the fixed JSON
-                    result = json.loads(fixed_json)
+                    result = _loads(fixed_json)
                     if isinstance(result, dict):
                         return result
                 except:
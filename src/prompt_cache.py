@@ -0,0 +1,199 @@
+"""
+Prompt Cache - Reuse model responses for repeated or similar prompts
+"""
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+class PromptCache:
+    """
+    Two-tier cache of model responses
+    
+    The exact tier is keyed by a SHA-256 hash of the model, system prompt
+    and prompt. The optional semantic tier embeds prompts and returns the
+    response of a cached prompt with the same model and system prompt whose
+    embedding is similar enough.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_entries: int = 256,
+        embed: Optional[Callable[[str], Optional[List[float]]]] = None,
+        similarity_threshold: float = 0.92
+    ):
+        """
+        Initialize the prompt cache
+        
+        Args:
+            ttl: Seconds a cached response stays valid
+            max_entries: Maximum number of cached responses
+            embed: Optional function returning the embedding of a prompt,
+                or None if it can't be embedded; enables the semantic tier
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        
+        # key -> (expiry time, scope, unit embedding or None, response), oldest first
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[np.ndarray], str]]" = OrderedDict()
+        
+        # Lookups and stores embed the same prompt, so unit embeddings are
+        # memoized (most recent last); failed embeddings are not, so a
+        # transient error doesn't disable the semantic tier for a prompt
+        self._embed = embed
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+    
+    @staticmethod
+    def key(model: str, system_prompt: Optional[str], prompt: str) -> str:
+        """
+        Build the exact-match key of a request
+        
+        Args:
+            model: Model name
+            system_prompt: System prompt, if any
+            prompt: User prompt
+            
+        Returns:
+            str: Hex SHA-256 digest of the request
+        """
+        payload = json.dumps({"model": model, "sys": system_prompt, "prompt": prompt}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    @staticmethod
+    def scope(model: str, system_prompt: Optional[str]) -> str:
+        """
+        Build the key of the requests a semantic hit may be served from
+        
+        Args:
+            model: Model name
+            system_prompt: System prompt, if any
+            
+        Returns:
+            str: Hex SHA-256 digest of the model and system prompt
+        """
+        return PromptCache.key(model, system_prompt, "")
+    
+    def get(self, key: str, scope: Optional[str] = None, prompt: Optional[str] = None) -> Optional[str]:
+        """
+        Look up a cached response
+        
+        Args:
+            key: Exact-match key from PromptCache.key
+            scope: Semantic scope from PromptCache.scope
+            prompt: User prompt, embedded for the semantic tier
+            
+        Returns:
+            Optional[str]: Cached response, or None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[3]
+        
+        # Fall back to the most similar prompt in the same scope
+        vector = self._embedding(prompt) if scope is not None else None
+        if vector is None:
+            return None
+        
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for entry_key, (_, entry_scope, entry_vector, _) in self._entries.items():
+                if entry_scope == scope and entry_vector is not None:
+                    score = float(entry_vector @ vector)
+                    if score >= best_score:
+                        best_key, best_score = entry_key, score
+            
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][3]
+    
+    def put(self, key: str, response: str, scope: Optional[str] = None, prompt: Optional[str] = None) -> None:
+        """
+        Store a response
+        
+        Args:
+            key: Exact-match key from PromptCache.key
+            response: Model response to cache
+            scope: Semantic scope from PromptCache.scope
+            prompt: User prompt, embedded for the semantic tier
+        """
+        vector = self._embedding(prompt) if scope is not None else None
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, scope or "", vector, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def discard(self, key: str) -> None:
+        """
+        Drop a cached response, if there is one
+        
+        Args:
+            key: Exact-match key from PromptCache.key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+    
+    def _evict_expired(self, now: float) -> None:
+        """
+        Drop expired entries; the caller holds the lock
+        
+        Args:
+            now: Current monotonic time
+        """
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+    
+    def _embedding(self, prompt: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Get the unit-length embedding of a prompt for the semantic tier
+        
+        Args:
+            prompt: User prompt
+            
+        Returns:
+            Optional[np.ndarray]: Normalized embedding, or None if the
+                semantic tier is disabled or the prompt can't be embedded
+        """
+        if self._embed is None or not prompt:
+            return None
+        
+        with self._lock:
+            vector = self._embeddings.get(prompt)
+            if vector is not None:
+                self._embeddings.move_to_end(prompt)
+                return vector
+        
+        embedding = self._embed(prompt)
+        if not embedding:
+            return None
+        
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return None
+        vector = vector / norm
+        
+        with self._lock:
+            self._embeddings[prompt] = vector
+            while len(self._embeddings) > self.max_entries:
+                self._embeddings.popitem(last=False)
+        return vector
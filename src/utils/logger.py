@@ -2,12 +2,18 @@
 Logger utility for Flow Diagram Animation Assistant
 """
 import os
+import queue
+import atexit
 import logging
 import sys
-from logging.handlers import RotatingFileHandler
+import functools
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Load environment variables once, before any logger reads LOG_LEVEL
+load_dotenv()
+
 def setup_logger(name: str = None) -> logging.Logger:
     """
     Set up and configure logger
@@ -18,17 +24,26 @@ def setup_logger(name: str = None) -> logging.Logger:
     Returns:
         logging.Logger: Configured logger
     """
-    # Load environment variables
-    load_dotenv()
-    
-    # Get logger name
+    # Get the name of the calling module from its frame's globals
     if name is None:
-        # Get the name of the calling module
-        import inspect
-        frame = inspect.stack()[1]
-        module = inspect.getmodule(frame[0])
-        name = module.__name__ if module else "flow_diagram_assistant"
+        try:
+            name = sys._getframe(1).f_globals.get("__name__", "flow_diagram_assistant")
+        except ValueError:
+            name = "flow_diagram_assistant"
     
+    return _configure_logger(name)
+
+@functools.lru_cache(maxsize=None)
+def _configure_logger(name: str) -> logging.Logger:
+    """
+    Configure a logger's level and handlers, at most once per name
+    
+    Args:
+        name: Logger name
+        
+    Returns:
+        logging.Logger: Configured logger
+    """
     # Create logger
     logger = logging.getLogger(name)
     
@@ -37,10 +52,36 @@ def setup_logger(name: str = None) -> logging.Logger:
         return logger
     
     # Set log level from environment variable or default to INFO
-    log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
-    log_level = getattr(logging, log_level_str, logging.INFO)
+    log_level = _log_level()
     logger.setLevel(log_level)
     
+    # Records are only queued on the calling thread; the shared listener
+    # formats and writes them in the background
+    logger.addHandler(QueueHandler(_log_queue()))
+    
+    return logger
+
+def _log_level() -> int:
+    """
+    Get the configured log level
+    
+    Returns:
+        int: Level named by LOG_LEVEL, or INFO
+    """
+    log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
+    return getattr(logging, log_level_str, logging.INFO)
+
+@functools.lru_cache(maxsize=1)
+def _log_queue() -> queue.Queue:
+    """
+    Create the queue shared by every configured logger, and start the
+    listener that writes its records to the file and console handlers
+    
+    Returns:
+        queue.Queue: Unbounded log record queue
+    """
+    log_level = _log_level()
+    
     # Create logs directory if it doesn't exist
     logs_dir = Path("logs")
     logs_dir.mkdir(exist_ok=True)
@@ -53,7 +94,7 @@ def setup_logger(name: str = None) -> logging.Logger:
         "%(levelname)s - %(message)s"
     )
     
-    # Create and add file handler (rotating log file)
+    # Create file handler (rotating log file)
     file_handler = RotatingFileHandler(
         logs_dir / "flow_diagram_assistant.log",
         maxBytes=10 * 1024 * 1024,  # 10 MB
@@ -61,12 +102,17 @@ def setup_logger(name: str = None) -> logging.Logger:
     )
     file_handler.setFormatter(file_formatter)
     file_handler.setLevel(log_level)
-    logger.addHandler(file_handler)
     
-    # Create and add console handler
+    # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(console_formatter)
     console_handler.setLevel(log_level)
-    logger.addHandler(console_handler)
     
-    return logger
\ No newline at end of file
+    # Drain the queue on a background thread; stopping at exit flushes
+    # whatever is still queued
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    return log_queue
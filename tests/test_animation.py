@@ -0,0 +1,130 @@
+"""
+Tests for the Plotly diagram animation
+"""
+import numpy as np
+import pytest
+
+from src.animation import HIGHLIGHT_COLOR, animate_diagram
+from src.diagram_generator import DiagramGenerator
+
+class FakeContainer:
+    """Streamlit container that keeps the chart instead of rendering it"""
+    
+    def plotly_chart(self, fig, **kwargs):
+        self.fig = fig
+
+def animate(animations):
+    """Animate a three-node diagram; returns (diagram data, figure)"""
+    diagram_data = DiagramGenerator().generate({
+        "title": "Flow",
+        "nodes": [
+            {"id": "a", "label": "A", "type": "start"},
+            {"id": "b", "label": "B", "type": "process"},
+            {"id": "c", "label": "C", "type": "decision"},
+        ],
+        "edges": [
+            {"from": "a", "to": "b"},
+            {"from": "b", "to": "c", "label": "yes", "type": "conditional"},
+        ],
+        "animations": [dict(anim) for anim in animations],
+    })
+    container = FakeContainer()
+    animate_diagram(diagram_data, container=container)
+    return diagram_data, container.fig
+
+def frame(fig, name):
+    """Per-trace data of a frame, keyed by trace name"""
+    frame = next(frame for frame in fig.frames if frame.name == name)
+    return {trace.name: data for trace, data in zip(fig.data, frame.data)}
+
+def shown_nodes(data, diagram_data):
+    """Ids of the nodes a frame places on the canvas"""
+    x = np.asarray(data["nodes"].x, dtype=float)
+    return {node for node, i in diagram_data["_node_idx"].items() if not np.isnan(x[i])}
+
+def node_style(data, diagram_data, node):
+    """(color, size) of a node in a frame"""
+    marker = data["nodes"].marker
+    i = diagram_data["_node_idx"][node]
+    return marker.color[i], marker.size[i]
+
+def edge_shown(fig, data, diagram_data, edge, highlight=False):
+    """Whether a frame draws an edge in its base trace or highlight overlay"""
+    i = diagram_data["_edge_idx"][edge]
+    for trace in fig.data:
+        if trace.name.startswith("edges_") and trace.name.endswith("_highlight") == highlight and i in trace.meta:
+            offset = 3 * list(trace.meta).index(i)
+            return not np.isnan(np.asarray(data[trace.name].x[offset:offset + 2], dtype=float)).any()
+    raise AssertionError(f"no trace draws {edge}")
+
+ANIMATIONS = [
+    {"element": "a", "effect": "fadeIn", "order": 1},
+    {"element": "b", "effect": "highlight", "order": 2},
+    {"element": "edge_a_b", "effect": "draw", "order": 2},
+    {"element": "c", "effect": "pulse", "order": 3},
+    {"element": "edge_c_b", "effect": "highlight", "order": 3},
+]
+
+def test_fade_in_reveals_only_the_node():
+    diagram_data, fig = animate(ANIMATIONS)
+    data = frame(fig, "1")
+    
+    assert shown_nodes(data, diagram_data) == {"a"}
+    assert node_style(data, diagram_data, "a") == (diagram_data["graph"].nodes["a"]["color"], 12)
+    assert not edge_shown(fig, data, diagram_data, ("a", "b"))
+
+def test_highlight_recolors_and_enlarges_the_node():
+    diagram_data, fig = animate(ANIMATIONS)
+    data = frame(fig, "2")
+    
+    assert shown_nodes(data, diagram_data) == {"a", "b"}
+    assert node_style(data, diagram_data, "b") == (HIGHLIGHT_COLOR, pytest.approx(21))
+    assert edge_shown(fig, data, diagram_data, ("a", "b"))
+
+def test_pulse_enlarges_without_recoloring():
+    diagram_data, fig = animate(ANIMATIONS)
+    data = frame(fig, "3")
+    
+    assert shown_nodes(data, diagram_data) == {"a", "b", "c"}
+    assert node_style(data, diagram_data, "c") == (diagram_data["graph"].nodes["c"]["color"], pytest.approx(22.5))
+    assert node_style(data, diagram_data, "b")[0] == HIGHLIGHT_COLOR
+
+def test_reversed_edge_target_highlights_the_edge():
+    diagram_data, fig = animate(ANIMATIONS)
+    before, after = frame(fig, "2"), frame(fig, "3")
+    
+    assert not edge_shown(fig, before, diagram_data, ("b", "c"), highlight=True)
+    assert edge_shown(fig, after, diagram_data, ("b", "c"), highlight=True)
+    assert not edge_shown(fig, after, diagram_data, ("b", "c"))
+    
+    # The edge's label appears with it
+    assert not np.isnan(np.asarray(after["edge_labels"].x, dtype=float)).any()
+    assert np.isnan(np.asarray(before["edge_labels"].x, dtype=float)).all()
+
+def test_final_frame_shows_everything_unhighlighted():
+    diagram_data, fig = animate(ANIMATIONS)
+    data = frame(fig, "final")
+    
+    assert [f.name for f in fig.frames] == ["1", "2", "3", "final"]
+    assert shown_nodes(data, diagram_data) == {"a", "b", "c"}
+    for node in ("a", "b", "c"):
+        color, size = node_style(data, diagram_data, node)
+        assert color == diagram_data["graph"].nodes[node]["color"]
+        assert size in (12, 14, 15)
+    for edge in (("a", "b"), ("b", "c")):
+        assert edge_shown(fig, data, diagram_data, edge)
+        assert not edge_shown(fig, data, diagram_data, edge, highlight=True)
+    
+    # The figure opens on the final frame
+    assert np.array_equal(np.asarray(fig.data[-1].x, dtype=float), np.asarray(data["nodes"].x, dtype=float))
+
+def test_default_animation_reveals_nodes_then_edges():
+    diagram_data, fig = animate([])
+    
+    # One frame per node and edge, in topological order, then the final frame
+    assert len(fig.frames) == 3 + 2 + 1
+    revealed = [shown_nodes(frame(fig, name), diagram_data) for name in ("1", "2", "3")]
+    assert revealed == [{"a"}, {"a", "b"}, {"a", "b", "c"}]
+    assert edge_shown(fig, frame(fig, "4"), diagram_data, ("a", "b"))
+    assert not edge_shown(fig, frame(fig, "4"), diagram_data, ("b", "c"))
+    assert edge_shown(fig, frame(fig, "5"), diagram_data, ("b", "c"))
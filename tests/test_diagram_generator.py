@@ -0,0 +1,57 @@
+"""
+Tests for the diagram generator
+"""
+import networkx as nx
+import pytest
+
+import src.diagram_generator as diagram_generator
+from src.diagram_generator import DiagramGenerator, ENERGY_LAYOUT_MIN_NODES
+
+def chain(num_nodes, node_type):
+    """Diagram data of a linear chain of nodes of one type"""
+    return {
+        "title": "Chain",
+        "nodes": [{"id": f"n{i}", "label": f"N{i}", "type": node_type} for i in range(num_nodes)],
+        "edges": [{"from": f"n{i}", "to": f"n{i + 1}"} for i in range(num_nodes - 1)],
+    }
+
+@pytest.fixture
+def spring_methods(monkeypatch):
+    """Record the method of every spring layout call"""
+    methods = []
+    spring_layout = nx.spring_layout
+    
+    def recording_spring_layout(G, **kwargs):
+        methods.append(kwargs.get("method"))
+        return spring_layout(G, **kwargs)
+    
+    diagram_generator._layout_for.cache_clear()
+    monkeypatch.setattr(diagram_generator.nx, "spring_layout", recording_spring_layout)
+    monkeypatch.setattr(diagram_generator, "_HAS_DOT", False)
+    yield methods
+    diagram_generator._layout_for.cache_clear()
+
+def test_large_typed_diagram_keeps_the_multipartite_layout(spring_methods):
+    diagram = DiagramGenerator().generate(chain(ENERGY_LAYOUT_MIN_NODES + 50, "process"))
+    
+    # Every node has the same type, so they all share one layer
+    assert len({x for x, _ in diagram["layout"].values()}) == 1
+    assert spring_methods == []
+
+@pytest.mark.skipif(not diagram_generator._HAS_ENERGY_LAYOUT, reason="needs NetworkX 3.5+ and SciPy")
+def test_large_untyped_diagram_uses_the_energy_layout(spring_methods):
+    DiagramGenerator().generate(chain(ENERGY_LAYOUT_MIN_NODES + 50, None))
+    DiagramGenerator().generate(chain(10, None))
+    
+    assert spring_methods == ["energy", None]
+
+def test_changing_a_layout_leaves_the_memoized_one_intact():
+    generator = DiagramGenerator()
+    first = generator.generate(chain(3, "process"))
+    original = [list(xy) for xy in first["layout"].values()]
+    
+    first["layout"]["n0"][0] += 100.0
+    first["layout"]["n1"].append(0.0)
+    second = generator.generate(chain(3, "process"))
+    
+    assert [list(xy) for xy in second["layout"].values()] == original
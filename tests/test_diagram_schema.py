@@ -0,0 +1,79 @@
+"""
+Tests for diagram schema validation
+"""
+import copy
+import pytest
+
+from src.diagram_schema import DiagramEdge, validate_diagram
+
+VALID_DIAGRAM = {
+    "title": "Login",
+    "description": "User login",
+    "nodes": [
+        {"id": "start", "label": "Start", "type": "start"},
+        {"id": "check", "label": "Valid?", "type": "decision"},
+    ],
+    "edges": [{"from": "start", "to": "check", "label": "submit", "type": "normal"}],
+    "animations": [{"element": "start", "effect": "fadeIn", "duration": 0.8, "order": 1}],
+}
+
+def test_valid_diagram_passes_unchanged():
+    assert validate_diagram(copy.deepcopy(VALID_DIAGRAM)) == VALID_DIAGRAM
+
+def test_absent_optional_fields_stay_absent():
+    diagram = {"title": "T", "nodes": [{"id": "a"}], "edges": [{"from": "a", "to": "a"}]}
+    
+    assert validate_diagram(diagram) == diagram
+
+def test_numeric_strings_are_coerced():
+    diagram = copy.deepcopy(VALID_DIAGRAM)
+    diagram["animations"][0].update(order="1", duration="0.8")
+    
+    animation = validate_diagram(diagram)["animations"][0]
+    
+    assert animation["order"] == 1 and not isinstance(animation["order"], str)
+    assert animation["duration"] == 0.8
+    assert type(validate_diagram(copy.deepcopy(VALID_DIAGRAM))["animations"][0]["order"]) is int
+
+def test_non_numeric_order_is_rejected():
+    diagram = copy.deepcopy(VALID_DIAGRAM)
+    diagram["animations"][0]["order"] = "first"
+    
+    with pytest.raises(ValueError, match="order"):
+        validate_diagram(diagram)
+
+def test_missing_nodes_list_is_rejected():
+    diagram = copy.deepcopy(VALID_DIAGRAM)
+    del diagram["nodes"]
+    
+    with pytest.raises(ValueError, match="nodes"):
+        validate_diagram(diagram)
+
+def test_edge_without_endpoint_is_rejected():
+    diagram = copy.deepcopy(VALID_DIAGRAM)
+    del diagram["edges"][0]["from"]
+    
+    with pytest.raises(ValueError, match="from"):
+        validate_diagram(diagram)
+
+def test_edge_from_alias_round_trips():
+    data = {"from": "start", "to": "check", "label": "submit"}
+    validate = getattr(DiagramEdge, "model_validate", None) or DiagramEdge.parse_obj
+    dump = getattr(DiagramEdge, "model_dump", None) or DiagramEdge.dict
+    
+    edge = validate(data)
+    
+    assert edge.from_ == "start"
+    assert dump(edge, by_alias=True, exclude_none=True) == data
+
+def test_unknown_keys_are_allowed_and_kept():
+    diagram = copy.deepcopy(VALID_DIAGRAM)
+    diagram["theme"] = "dark"
+    diagram["nodes"][0]["icon"] = "user"
+    diagram["edges"][0]["weight"] = 2
+    
+    diagram = validate_diagram(diagram)
+    
+    assert diagram["theme"] == "dark"
+    assert diagram["nodes"][0]["icon"] == "user"
+    assert diagram["edges"][0]["weight"] == 2
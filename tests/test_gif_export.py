@@ -0,0 +1,185 @@
+"""
+Tests for GIF export
+"""
+import io
+import networkx as nx
+import numpy as np
+import pytest
+from matplotlib.colors import to_rgb
+from PIL import Image
+
+import src.gif_export as gif_export
+from src.diagram_generator import DiagramGenerator
+from src.gif_export import _diagram_colors, _frame_palette, _quantize, export_as_gif
+from src.gif_frames import _edge_geometry, _frame_canvas, _render_frames
+
+def chain(num_nodes=4, labels=True):
+    """Generated diagram of a chain of nodes, with a decision in the middle"""
+    nodes = [{"id": f"n{i}", "label": f"N{i}", "type": "process"} for i in range(num_nodes)]
+    nodes[1]["type"] = "decision"
+    edges = [
+        {"from": f"n{i}", "to": f"n{i + 1}", "label": f"e{i}" if labels else ""}
+        for i in range(num_nodes - 1)
+    ]
+    return DiagramGenerator().generate({"title": "Chain", "nodes": nodes, "edges": edges})
+
+def scene(diagram_data):
+    """Static scene of a generated diagram, as export_as_gif builds it"""
+    return {
+        "graph": diagram_data["graph"],
+        "pos": dict(diagram_data["pos"]),
+        "title": diagram_data["title"],
+        "node_groups": diagram_data["node_groups"],
+        "node_idx": diagram_data["_node_idx"],
+        "soa": diagram_data["soa"]
+    }
+
+def state(nodes=(), edges=(), highlighted_nodes=(), highlighted_edges=()):
+    return {
+        "visible_nodes": set(nodes),
+        "visible_edges": set(edges),
+        "highlighted_nodes": set(highlighted_nodes),
+        "highlighted_edges": set(highlighted_edges)
+    }
+
+def distance_near(image, xy, color):
+    """Smallest per-channel difference to a color around a data coordinate"""
+    _, ax = _frame_canvas()
+    x, y = np.round(ax.transData.transform(xy)).astype(int)
+    row = image.shape[0] - 1 - y
+    window = image[row - 3:row + 4, x - 3:x + 4].reshape(-1, 3) / 255
+    return np.abs(window - to_rgb(color)).max(axis=1).min()
+
+def test_last_incremental_frame_equals_a_full_redraw():
+    diagram_data = chain()
+    states = [
+        state(["n0"]),
+        state(["n0", "n1"], [("n0", "n1")]),
+        state(["n0", "n1", "n2"], [("n0", "n1"), ("n1", "n2")], ["n1"]),
+        state(["n0", "n1", "n2", "n3"], [("n0", "n1"), ("n1", "n2"), ("n2", "n3")], ["n1", "n3"], [("n0", "n1")]),
+    ]
+    
+    incremental = _render_frames(scene(diagram_data), states)
+    
+    for k in (1, len(states) - 1):
+        full = _render_frames(scene(diagram_data), [states[k]])[0]
+        assert np.array_equal(incremental[k], full)
+
+def test_rehighlighted_edge_is_redrawn_in_the_highlight_color():
+    diagram_data = chain(labels=False)
+    edge = ("n0", "n1")
+    drawn = state(["n0", "n1"], [edge])
+    highlighted = state(["n0", "n1"], [edge], highlighted_edges=[edge])
+    
+    plain_frame, highlight_frame, plain_again = _render_frames(scene(diagram_data), [drawn, highlighted, drawn])
+    
+    # Around a point a quarter of the way along the edge
+    pos = diagram_data["pos"]
+    point = 0.75 * np.asarray(pos["n0"]) + 0.25 * np.asarray(pos["n1"])
+    edge_color = diagram_data["graph"].edges[edge]["color"]
+    for image, color, other in [
+        (plain_frame, edge_color, "#FF9800"),
+        (highlight_frame, "#FF9800", edge_color),
+        (plain_again, edge_color, "#FF9800"),
+    ]:
+        assert distance_near(image, point, color) < 0.05
+        assert distance_near(image, point, other) > 0.3
+
+def test_edge_geometry_matches_networkx_arrows():
+    fig, ax = _frame_canvas()
+    ax.clear()
+    pos = {"a": (0.0, 0.0), "b": (1.0, 0.5), "c": (1.0, -0.5), "d": (0.0, -1.0)}
+    ax.update_datalim(np.asarray(list(pos.values())))
+    ax.autoscale_view()
+    ax.set_autoscale_on(False)
+    
+    # a -> b points right and up, c -> d left and down
+    G = nx.DiGraph([("a", "b"), ("c", "d")])
+    patches = nx.draw_networkx_edges(G, pos, arrows=True, arrowsize=15, width=1.5, ax=ax)
+    fig.canvas.draw()
+    lines, heads = _edge_geometry(ax, np.asarray([[pos[u], pos[v]] for u, v in G.edges()]), 1.5)
+    
+    to_px = ax.transData.transform
+    for patch, line, head, (u, v) in zip(patches, lines, heads, G.edges()):
+        vertices = to_px(patch.get_path().vertices[:-1])
+        direction = np.subtract(pos[v], pos[u])
+        tip = vertices[np.argmax(vertices @ direction)]
+        
+        assert np.allclose(to_px(line[0]), vertices[0], atol=0.5)
+        assert np.allclose(to_px(head[0]), tip, atol=0.5)
+        for corner in to_px(head[1:]):
+            assert np.abs(vertices - corner).max(axis=1).min() < 0.5
+
+def test_diagram_colors_are_exact_in_the_gif():
+    nodes = [{"id": "a", "label": "A"}, {"id": "b", "label": "B", "type": "decision"}]
+    edges = [
+        {"from": "a", "to": "b", "label": "go", "type": "conditional"},
+        {"from": "b", "to": "b", "label": "retry", "type": "feedback"},
+    ]
+    animations = [
+        {"element": "a", "effect": "fadeIn", "order": 1},
+        {"element": "b", "effect": "highlight", "order": 2},
+        {"element": "edge_a_b", "effect": "draw", "order": 2},
+        {"element": "edge_b_b", "effect": "highlight", "order": 3},
+    ]
+    diagram_data = DiagramGenerator().generate(
+        {"title": "Loop", "nodes": nodes, "edges": edges, "animations": animations}
+    )
+    
+    gif = Image.open(io.BytesIO(export_as_gif(diagram_data, duration=1.0, fps=6)))
+    gif.seek(gif.n_frames - 1)
+    frame = np.asarray(gif.convert("RGB"))
+    final = state(["a", "b"], [("a", "b"), ("b", "b")], ["b"], [("b", "b")])
+    rendered = _render_frames(scene(diagram_data), [final])[0]
+    
+    # Pixels drawn in one of the diagram's own colors come out unchanged
+    for color in _diagram_colors(diagram_data["soa"]):
+        exact = (rendered == color).all(axis=2)
+        assert (frame[exact] == color).all()
+    assert (frame[0, 0] == 255).all()
+
+def test_fixed_colors_are_not_moved_to_a_nearby_palette_color():
+    fixed = [(255, 255, 255), (0, 0, 0)]
+    palette = _frame_palette(Image.new("RGB", (4, 4), (250, 250, 250)), fixed, 8)
+    image = np.full((4, 4, 3), 255, dtype=np.uint8)
+    image[0, 0] = (250, 250, 250)
+    
+    quantized = np.asarray(_quantize(image, palette, fixed).convert("RGB"))
+    
+    assert (quantized.reshape(-1, 3)[1:] == 255).all()
+    assert tuple(quantized[0, 0]) == (250, 250, 250)
+
+@pytest.fixture
+def frame_pool(monkeypatch):
+    """Render exports of any length in a two-worker pool, even on one CPU"""
+    monkeypatch.setattr(gif_export, "GIF_POOL_MIN_STEPS", 1)
+    monkeypatch.setattr(gif_export.os, "cpu_count", lambda: 2)
+    gif_export._get_frame_executor.cache_clear()
+    yield
+    gif_export._get_frame_executor().shutdown()
+    gif_export._get_frame_executor.cache_clear()
+
+def test_pooled_and_serial_exports_are_identical(frame_pool, monkeypatch):
+    diagram_data = chain(6)
+    diagram_data["animations"] = [
+        {"element": "n0", "effect": "fadeIn", "order": 1},
+        {"element": "n1", "effect": "highlight", "order": 2},
+        {"element": "edge_n0_n1", "effect": "draw", "order": 2},
+        {"element": "n2", "effect": "fadeIn", "order": 3},
+        {"element": "edge_n1_n2", "effect": "draw", "order": 3},
+        {"element": "edge_n0_n1", "effect": "highlight", "order": 4},
+        {"element": "n3", "effect": "pulse", "order": 5},
+    ]
+    
+    pooled = export_as_gif(diagram_data, duration=1.0, fps=10)
+    
+    # The pool ran, and its workers didn't have to import Streamlit
+    assert gif_export._get_frame_executor.cache_info().currsize == 1
+    in_worker = "'streamlit' in __import__('sys').modules"
+    assert gif_export._get_frame_executor().submit(eval, in_worker).result() is False
+    
+    monkeypatch.setattr(gif_export, "GIF_POOL_MIN_STEPS", 10 ** 6)
+    serial = export_as_gif(diagram_data, duration=1.0, fps=10)
+    
+    assert pooled == serial
+    assert Image.open(io.BytesIO(pooled)).n_frames == 5
@@ -0,0 +1,36 @@
+"""
+Tests for Mermaid generation
+"""
+from src.mermaid_generator import generate_mermaid
+
+def test_link_styles_are_numbered_by_emitted_link():
+    diagram = {
+        "title": "Loops",
+        "nodes": [{"id": "a"}, {"id": "b"}, {"id": "c"}],
+        "edges": [
+            {"from": "a", "to": "b"},
+            {"from": "a"},
+            {"from": "b", "to": "b", "type": "feedback"},
+            {"from": "", "to": "c", "type": "conditional"},
+            {"from": "b", "to": "c", "label": "retry", "type": "conditional"},
+        ],
+    }
+    
+    lines = generate_mermaid(diagram).splitlines()
+    link_styles = [line.split()[1] for line in lines if line.strip().startswith("linkStyle")]
+    
+    # Links are a->b (0), b->b (1) and b->c (2); edges missing an end are skipped
+    assert link_styles == ["1", "2"]
+    assert "    b -- retry -- >c" in lines
+
+def test_decision_node_renders_its_label():
+    diagram = {
+        "title": "Check",
+        "nodes": [{"id": "q", "label": "Valid?", "type": "decision"}],
+        "edges": [],
+    }
+    
+    lines = generate_mermaid(diagram).splitlines()
+    
+    assert '    q{"Valid?"}' in lines
+    assert "    style q fill:#FBBC05,stroke:#333,color:black" in lines
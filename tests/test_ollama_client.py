@@ -0,0 +1,183 @@
+"""
+Tests for the Ollama client
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+from src.diagram_generator import DiagramGenerator
+from src.gif_export import export_as_gif
+from src.ollama_client import OLLAMA_MAX_CONCURRENCY, OllamaClient, _balanced_json_objects
+
+class FakeStreamResponse:
+    """Minimal streamed requests.Response replaying NDJSON lines"""
+    
+    def __init__(self, lines, status_code=200):
+        self.lines = lines
+        self.status_code = status_code
+        self.text = ""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def iter_lines(self):
+        return iter(self.lines)
+    
+    def raise_for_status(self):
+        pass
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """Client that never touches the network; log files go to tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(OllamaClient, "_resolve_model", lambda self, model_name: (True, model_name))
+    return OllamaClient("http://ollama.test", "llama2")
+
+def stream_lines(*chunks):
+    """Encode response chunks as Ollama NDJSON lines"""
+    return [json.dumps(chunk).encode() for chunk in chunks]
+
+def use_stream(client, lines):
+    """Make the client's next generate calls replay lines; returns the call log"""
+    calls = []
+    
+    def post(url, **kwargs):
+        calls.append(url)
+        return FakeStreamResponse(lines)
+    
+    client._session.post = post
+    return calls
+
+def test_generate_joins_streamed_tokens_and_caches(client):
+    calls = use_stream(client, stream_lines(
+        {"response": "Hel"}, {"response": "lo"}, {"response": "", "done": True}
+    ))
+    
+    assert client.generate("hi") == "Hello"
+    assert client.generate("hi") == "Hello"
+    assert len(calls) == 1
+
+def test_malformed_chunk_raises_runtime_error(client):
+    use_stream(client, stream_lines({"response": "a"}) + [b"{not json"])
+    
+    with pytest.raises(RuntimeError, match="malformed"):
+        client.generate("hi")
+
+def test_error_chunk_raises_runtime_error(client):
+    use_stream(client, stream_lines({"error": "model not found"}))
+    
+    with pytest.raises(RuntimeError, match="model not found"):
+        client.generate("hi")
+
+def test_incomplete_stream_is_not_cached(client):
+    calls = use_stream(client, stream_lines({"response": "partial"}))
+    
+    assert client.generate("hi") == "partial"
+    assert client.generate("hi") == "partial"
+    assert len(calls) == 2
+
+def test_json_object_is_found_inside_prose():
+    text = 'Here is your diagram:\n{"title": "Login", "nodes": []}\nHope this helps!'
+    
+    assert list(_balanced_json_objects(text)) == ['{"title": "Login", "nodes": []}']
+
+def test_braces_and_escaped_quotes_inside_strings_are_ignored():
+    obj = '{"label": "Enter {creds}} \\"now\\" {", "path": "C:\\\\"}'
+    
+    assert list(_balanced_json_objects("x " + obj + " y")) == [obj]
+    assert json.loads(obj)["label"] == 'Enter {creds}} "now" {'
+
+def test_unclosed_object_is_skipped_for_a_later_valid_one():
+    text = 'Use a { brace, then {"title": "T", "nodes": [{"id": "a"}]}'
+    
+    assert list(_balanced_json_objects(text)) == ['{"title": "T", "nodes": [{"id": "a"}]}']
+    assert list(_balanced_json_objects('truncated {"a": [1, 2')) == []
+
+def test_multiple_objects_are_yielded_in_order():
+    text = 'first {"a": 1} then {"b": {"c": 2}} done'
+    
+    assert list(_balanced_json_objects(text)) == ['{"a": 1}', '{"b": {"c": 2}}']
+
+def test_extract_json_content_skips_unparseable_candidates(client):
+    text = 'Use {placeholders} like this: {"title": "T", "nodes": [], "edges": []}'
+    
+    assert client._extract_json_content(text) == {"title": "T", "nodes": [], "edges": []}
+
+def test_invalid_diagram_falls_back_to_fixed_diagram(client):
+    valid = '{"title": "T", "nodes": [{"id": "a"}], "edges": []}'
+    invalid = '{"title": "T", "nodes": [{"label": "no id"}], "edges": []}'
+    
+    assert client._parse_flow_response("login", valid)["title"] == "T"
+    assert client._parse_flow_response("login", invalid)["title"] == "Flow Diagram"
+
+def test_fallback_response_is_not_served_from_the_cache(client):
+    calls = use_stream(client, stream_lines({"response": "Sorry, no JSON here"}, {"done": True}))
+    
+    assert client.generate_flow_description("login")["_fallback"] is True
+    client.generate_flow_description("login")
+    assert len(calls) == 2
+
+def test_parsed_response_is_served_from_the_cache(client):
+    diagram = '{"title": "T", "nodes": [{"id": "a", "label": "A"}], "edges": []}'
+    calls = use_stream(client, stream_lines({"response": diagram}, {"done": True}))
+    
+    assert "_fallback" not in client.generate_flow_description("login")
+    client.generate_flow_description("login")
+    assert len(calls) == 1
+
+def test_numeric_strings_reach_the_animation_code_as_numbers(client):
+    response = json.dumps({
+        "title": "T",
+        "nodes": [{"id": "a", "label": "A"}, {"id": "b", "label": "B"}],
+        "edges": [{"from": "a", "to": "b"}],
+        "animations": [
+            {"element": "a", "effect": "fadeIn", "order": "1", "duration": "0.8"},
+            {"element": "b", "effect": "fadeIn", "order": 2},
+        ],
+    })
+    
+    diagram_data = client._parse_flow_response("login", response)
+    
+    assert [anim["order"] for anim in diagram_data["animations"]] == [1, 2]
+    assert diagram_data["animations"][0]["duration"] == 0.8
+    gif = export_as_gif(DiagramGenerator().generate(diagram_data), duration=1.0, fps=4)
+    assert gif.startswith(b"GIF")
+
+def test_concurrent_requests_beyond_the_semaphore_keep_their_connections(client, caplog):
+    class OllamaStub(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(0.2)
+            body = b'{"response": "ok", "done": true}\n'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OllamaStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    shared = OllamaClient(f"http://127.0.0.1:{server.server_port}", "llama2")
+    
+    # More sessions than OLLAMA_MAX_CONCURRENCY generating at the same time
+    sessions = 2 * OLLAMA_MAX_CONCURRENCY
+    try:
+        with ThreadPoolExecutor(sessions) as pool:
+            results = list(pool.map(shared.generate, [f"prompt {i}" for i in range(sessions)]))
+    finally:
+        shared.close()
+        server.shutdown()
+        server.server_close()
+    
+    assert results == ["ok"] * sessions
+    assert "Connection pool is full" not in caplog.text
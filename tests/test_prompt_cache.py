@@ -0,0 +1,97 @@
+"""
+Tests for the prompt cache
+"""
+import pytest
+
+import src.prompt_cache as prompt_cache
+from src.prompt_cache import PromptCache
+
+SCOPE = PromptCache.scope("llama2", "system")
+
+# Fixed embeddings; "login" and "sign in" are close, "invoice" is not
+EMBEDDINGS = {
+    "login flow": [1.0, 0.0, 0.0],
+    "sign in flow": [0.95, 0.3, 0.0],
+    "invoice flow": [0.0, 0.0, 1.0],
+}
+
+def key(prompt):
+    return PromptCache.key("llama2", "system", prompt)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock for TTL checks"""
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_exact_hit_and_miss():
+    cache = PromptCache()
+    cache.put(key("login flow"), "diagram")
+    
+    assert cache.get(key("login flow")) == "diagram"
+    assert cache.get(key("invoice flow")) is None
+    assert key("login flow") != PromptCache.key("mistral", "system", "login flow")
+
+def test_semantic_hit_above_threshold():
+    cache = PromptCache(embed=EMBEDDINGS.get, similarity_threshold=0.92)
+    cache.put(key("login flow"), "login diagram", SCOPE, "login flow")
+    
+    assert cache.get(key("sign in flow"), SCOPE, "sign in flow") == "login diagram"
+
+def test_semantic_miss_below_threshold_or_other_scope():
+    cache = PromptCache(embed=EMBEDDINGS.get, similarity_threshold=0.99)
+    cache.put(key("login flow"), "login diagram", SCOPE, "login flow")
+    
+    assert cache.get(key("sign in flow"), SCOPE, "sign in flow") is None
+    assert cache.get(key("invoice flow"), SCOPE, "invoice flow") is None
+    
+    other_scope = PromptCache.scope("mistral", "system")
+    loose = PromptCache(embed=EMBEDDINGS.get, similarity_threshold=0.5)
+    loose.put(key("login flow"), "login diagram", SCOPE, "login flow")
+    assert loose.get(key("sign in flow"), other_scope, "sign in flow") is None
+
+def test_discarded_entry_is_gone_from_both_tiers():
+    cache = PromptCache(embed=EMBEDDINGS.get, similarity_threshold=0.92)
+    cache.put(key("login flow"), "login diagram", SCOPE, "login flow")
+    
+    cache.discard(key("login flow"))
+    cache.discard(key("never stored"))
+    
+    assert cache.get(key("login flow"), SCOPE, "login flow") is None
+    assert cache.get(key("sign in flow"), SCOPE, "sign in flow") is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = PromptCache(ttl=60)
+    cache.put(key("login flow"), "diagram")
+    
+    clock[0] += 59
+    assert cache.get(key("login flow")) == "diagram"
+    clock[0] += 2
+    assert cache.get(key("login flow")) is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PromptCache(max_entries=2)
+    cache.put(key("a"), "A")
+    cache.put(key("b"), "B")
+    cache.get(key("a"))
+    cache.put(key("c"), "C")
+    
+    assert cache.get(key("a")) == "A"
+    assert cache.get(key("b")) is None
+    assert cache.get(key("c")) == "C"
+
+def test_failed_embedding_is_retried():
+    results = [None, [1.0, 0.0, 0.0]]
+    calls = []
+    
+    def flaky_embed(prompt):
+        calls.append(prompt)
+        return results[len(calls) - 1]
+    
+    cache = PromptCache(embed=flaky_embed)
+    cache.put(key("login flow"), "diagram", SCOPE, "login flow")
+    cache.put(key("login flow"), "diagram", SCOPE, "login flow")
+    cache.get(key("sign in flow"), SCOPE, "login flow")
+    
+    assert len(calls) == 2